@@ -0,0 +1,39 @@
+"""In-process cache of JSON-encoded message summaries.
+
+Entries are keyed on (account, folder, UIDVALIDITY, uid, flags): a flag
+change simply misses the cache, and so does every message once the server
+renumbers a folder (new UIDVALIDITY); stale variants age out of the LRU.
+The cache lives for the process, which pays off for in-process callers that
+run many commands (agent drivers, --repl) rather than for a single CLI run.
+"""
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import orjson
+
+from .types import MessageSummary, Profile
+
+_MAX_ENTRIES = 4096
+
+_summaries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+
+
+def account_key(profile: Profile) -> str:
+    """Key identifying a mailbox account, here and in the on-disk envelope cache."""
+    return f"{profile.email}@{profile.imap_host}"
+
+
+def summary_bytes(account: str, folder: str, uidvalidity: Optional[int], msg: MessageSummary) -> bytes:
+    """Indented JSON for msg.to_dict(), reused while the message's flags are unchanged."""
+    key = (account, folder, uidvalidity, msg.uid, msg.flags)
+    data = _summaries.get(key)
+    if data is not None:
+        _summaries.move_to_end(key)
+        return data
+    data = orjson.dumps(msg.to_dict(), option=orjson.OPT_INDENT_2)
+    _summaries[key] = data
+    if len(_summaries) > _MAX_ENTRIES:
+        _summaries.popitem(last=False)
+    return data
+
@@ -1,12 +1,15 @@
 """Click CLI entrypoint for AnyMail."""
 
 import click
-import json
+import functools
+import orjson
+import re
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Any, Optional
-from datetime import datetime, timedelta
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 import getpass
 
 from .config import (
@@ -14,29 +17,81 @@ from .config import (
     add_profile,
     remove_profile,
     get_profile,
+    get_config_dir,
+    ensure_config_dir,
     Profile,
 )
-from .keychain import (
-    get_password,
-    set_password,
-    clear_password,
-    has_password,
-)
-from .imap import IMAPClientWrapper
-from .parse import (
-    parse_message,
-    get_plaintext_body,
-    get_html_body,
-    get_attachments,
-    get_attachment_content,
-    get_reply_headers,
-    format_addresses,
-)
-from .smtp import send_email
-from .types import MessageSummary
+from .types import AttachmentInfo, MessageSummary
 from . import db as log_db
 
 
+# Dataclasses go through to_dict() so the JSON field names stay stable
+_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def _json_default(obj: Any) -> Any:
+    """orjson fallback: serialize types that provide to_dict()."""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+    return to_dict()
+
+
+def _emit_json(obj: Any) -> None:
+    """Write obj to stdout as indented JSON."""
+    out = sys.stdout.buffer
+    out.write(orjson.dumps(obj, default=_json_default, option=_JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE))
+    out.flush()
+
+
+def _write_json_array(elements: Iterable[bytes]) -> None:
+    """Write pre-encoded (OPT_INDENT_2) elements to stdout as an indented JSON array."""
+    out = sys.stdout.buffer
+    sep = b"[\n  "
+    for element in elements:
+        out.write(sep)
+        out.write(element.replace(b"\n", b"\n  "))
+        sep = b",\n  "
+    out.write(b"[]\n" if sep == b"[\n  " else b"\n]\n")
+    out.flush()
+
+
+def _released(messages: Iterable[Tuple[int, MessageSummary]]) -> Iterator[Tuple[int, MessageSummary]]:
+    """Pass (uid, summary) pairs through, releasing each summary once the consumer moves on."""
+    for uid, msg in messages:
+        yield uid, msg
+        msg.release()
+
+
+def _emit_columns(messages: Iterable[Tuple[int, MessageSummary]]) -> None:
+    """inbox/search --columnar: MessageSummary.to_columns() as JSON."""
+    summaries = [msg for _, msg in messages]
+    _emit_json(MessageSummary.to_columns(summaries))
+    for msg in summaries:
+        msg.release()
+
+
+# inbox/search --since: "7d" (the "d" is optional)
+_RELATIVE_DAYS = re.compile(r"^(\d+)d?$")
+
+# inbox/search listing row: status, flagged, uid, from, subject
+_ROW_FMT = "%s%s %6d  %-30s  %s"
+
+
+def _open_client(profile_obj: Profile, password: str):
+    """IMAP client for a command: the daemon's connection if one is running, else a direct one."""
+    # daemon.get_socket_path(), checked first so commands without a daemon skip the import
+    if (get_config_dir() / "sock").exists():
+        from . import daemon
+
+        client = daemon.connect(profile_obj)
+        if client is not None:
+            return client
+    from .imap import IMAPClientWrapper
+
+    return IMAPClientWrapper(profile_obj, password)
+
+
 # Global options
 def add_global_options(f):
     """Add global options to a command."""
@@ -47,6 +102,16 @@ def add_global_options(f):
     return f
 
 
+# Groups whose subcommand is part of the logged command path ("profile add")
+_SUBGROUPS = frozenset({"profile", "logs", "auth"})
+
+
+@functools.lru_cache(maxsize=256)
+def _encode_argv(argv: tuple) -> bytes:
+    """Sanitized, JSON-encoded argv for the invocation log."""
+    return orjson.dumps(log_db.sanitize_argv(list(argv)))
+
+
 class LoggingGroup(click.Group):
     """Click Group that logs every invocation to SQLite for agent monitoring."""
 
@@ -68,19 +133,12 @@ class LoggingGroup(click.Group):
             try:
                 path = "unknown"
                 if argv:
-                    path = argv[0]
-                    if path == "profile" and len(argv) > 1:
-                        path = f"profile {argv[1]}"
-                    elif path == "logs" and len(argv) > 1:
-                        path = f"logs {argv[1]}"
-                    elif path == "auth" and len(argv) > 1:
-                        path = f"auth {argv[1]}"
+                    head = argv[0]
+                    path = f"{head} {argv[1]}" if head in _SUBGROUPS and len(argv) > 1 else head
                 if not path or path == "unknown":
                     path = (getattr(ctx, "command_path", None) or "").replace("cli ", "").strip() or "unknown"
                 profile_used = ctx.params.get("profile") if ctx.params else None
-                args_sanitized = log_db.sanitize_argv(argv)
-                args_json = json.dumps(args_sanitized, ensure_ascii=False)
-                log_db.init_db()
+                args_json = _encode_argv(tuple(argv)).decode()
                 log_db.insert_log(
                     command=path,
                     args_json=args_json,
@@ -93,8 +151,91 @@ class LoggingGroup(click.Group):
                 pass
 
 
+# Held while _run_captured has the process-wide argv, std streams and cwd swapped
+_captured_lock = threading.Lock()
+
+
+def _run_captured(args: List[str], cwd: Optional[str] = None) -> Tuple[int, bytes, bytes]:
+    """Run one command in this process: (exit code, stdout, stderr).
+
+    With cwd, the command runs in that directory (as a subprocess started
+    there would), so relative paths such as --attach or --out resolve alike.
+    Calls from several threads run one at a time, since argv, the std streams
+    and the working directory are process-wide.
+    """
+    import contextlib
+    import io
+    import os
+    import traceback
+
+    with _captured_lock:
+        # Text wrappers over bytes, because JSON output goes to sys.stdout.buffer
+        out_bytes, err_bytes = io.BytesIO(), io.BytesIO()
+        out = io.TextIOWrapper(out_bytes, encoding="utf-8", write_through=True)
+        err = io.TextIOWrapper(err_bytes, encoding="utf-8", write_through=True)
+        saved_argv, saved_stdin = sys.argv, sys.stdin
+        # The invocation log reads argv; prompts and stdin readers see an empty input
+        sys.argv = ["anymail", *args]
+        sys.stdin = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        saved_cwd = os.getcwd() if cwd is not None else None
+        # Each command sees the keyring as it is now, not as an earlier one did
+        keychain = sys.modules.get(f"{__package__}.keychain")
+        if keychain is not None:
+            keychain.clear_cache()
+        try:
+            if cwd is not None:
+                os.chdir(cwd)
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                try:
+                    cli.main(list(args), prog_name="anymail")
+                    code = 0
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                except Exception:
+                    # What an uncaught exception would do to a subprocess
+                    traceback.print_exc()
+                    code = 1
+        finally:
+            sys.argv, sys.stdin = saved_argv, saved_stdin
+            if saved_cwd is not None:
+                os.chdir(saved_cwd)
+    return code, out_bytes.getvalue(), err_bytes.getvalue()
+
+
+def _repl(ctx: click.Context, param: click.Parameter, value: bool) -> None:
+    """--repl: serve commands from stdin until EOF, paying interpreter startup once.
+
+    Each request is one line holding a JSON array of arguments (as they would
+    follow `anymail`); each reply is one line {"code", "stdout", "stderr"}.
+    """
+    if not value or ctx.resilient_parsing:
+        return
+    stdin, out = sys.stdin.buffer, sys.stdout.buffer
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            args = orjson.loads(line)
+            if not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+                raise ValueError("request must be a JSON array of strings")
+        except ValueError as e:
+            reply = {"code": 2, "stdout": "", "stderr": f"Error: invalid request: {e}\n"}
+        else:
+            code, stdout, stderr = _run_captured(args)
+            reply = {
+                "code": code,
+                "stdout": stdout.decode("utf-8", "replace"),
+                "stderr": stderr.decode("utf-8", "replace"),
+            }
+        out.write(orjson.dumps(reply, option=orjson.OPT_APPEND_NEWLINE))
+        out.flush()
+    ctx.exit()
+
+
 @click.group(cls=LoggingGroup)
 @click.version_option()
+@click.option("--repl", is_flag=True, is_eager=True, expose_value=False, hidden=True, callback=_repl,
+              help="Serve commands as JSON lines on stdin/stdout")
 def cli():
     """AnyMail - A Windows-friendly email CLI for Gmail IMAP/SMTP."""
     pass
@@ -184,19 +325,19 @@ def profile_set(name, folder_inbox, folder_sent, folder_trash, folder_allmail, d
         click.echo(f"Profile '{name}' not found.", err=True)
         sys.exit(1)
     
-    profile = profiles[name]
+    changes = {}
     if folder_inbox:
-        profile.folder_inbox = folder_inbox
+        changes["folder_inbox"] = folder_inbox
     if folder_sent:
-        profile.folder_sent = folder_sent
+        changes["folder_sent"] = folder_sent
     if folder_trash:
-        profile.folder_trash = folder_trash
+        changes["folder_trash"] = folder_trash
     if folder_allmail:
-        profile.folder_allmail = folder_allmail
+        changes["folder_allmail"] = folder_allmail
     if default_from_name:
-        profile.default_from_name = default_from_name
+        changes["default_from_name"] = default_from_name
     
-    add_profile(profile)
+    add_profile(profiles[name].replace(**changes))
     click.echo(f"Profile '{name}' updated.")
 
 
@@ -256,6 +397,8 @@ def auth():
 @click.argument("profile_name")
 def auth_set(profile_name):
     """Set app password for a profile."""
+    from .keychain import set_password
+
     profiles = load_config()
     if profile_name not in profiles:
         click.echo(f"Profile '{profile_name}' not found.", err=True)
@@ -270,6 +413,8 @@ def auth_set(profile_name):
 @click.argument("profile_name")
 def auth_clear(profile_name):
     """Clear stored password for a profile."""
+    from .keychain import clear_password
+
     if clear_password(profile_name):
         click.echo(f"Password cleared for profile '{profile_name}'.")
     else:
@@ -281,6 +426,9 @@ def auth_clear(profile_name):
 @click.option("--profile", "-p", help="Profile name")
 def auth_status(profile):
     """Check authentication status."""
+    from .keychain import get_password, has_password
+    from .imap import IMAPClientWrapper
+
     try:
         profile_obj = get_profile(profile)
         if not profile_obj:
@@ -309,13 +457,16 @@ def auth_status(profile):
 @cli.command("inbox")
 @add_global_options
 @click.option("--unread", is_flag=True, help="Show only unread")
-@click.option("--limit", type=int, help="Limit number of results")
+@click.option("--limit", type=int, help="Limit number of results (newest first)")
 @click.option("--since", help="Show messages since (e.g., 7d, 30d)")
 @click.option("--from", "from_addr", help="Filter by sender")
 @click.option("--folder", help="Folder to list (default: inbox)")
 @click.option("--pipe", is_flag=True, help="Output UIDs only (one per line)")
-def inbox_cmd(profile, host, output_json, quiet, unread, limit, since, from_addr, folder, pipe):
+@click.option("--columnar", is_flag=True, help="JSON with one array per field (implies --json)")
+def inbox_cmd(profile, host, output_json, quiet, unread, limit, since, from_addr, folder, pipe, columnar):
     """List messages in inbox."""
+    from .keychain import get_password
+
     try:
         profile_obj = get_profile(profile)
         if not profile_obj:
@@ -323,51 +474,54 @@ def inbox_cmd(profile, host, output_json, quiet, unread, limit, since, from_addr
             sys.exit(1)
         
         if host:
-            profile_obj.imap_host = host
+            profile_obj = profile_obj.replace(imap_host=host)
         
         password = get_password(profile_obj.name)
         if not password:
             click.echo("No password stored. Use 'anymail auth set' first.", err=True)
             sys.exit(1)
         
-        # Parse since date
-        since_date = None
-        if since:
-            try:
-                days = int(since.rstrip("d"))
-                since_date = datetime.now() - timedelta(days=days)
-            except ValueError:
-                click.echo(f"Invalid --since format: {since}. Use format like '7d' or '30d'.", err=True)
-                sys.exit(1)
+        since_date = _parse_since(since) if since else None
         
-        with IMAPClientWrapper(profile_obj, password) as client:
+        with _open_client(profile_obj, password) as client:
             uids = client.search_messages(
                 folder=folder,
                 unread=unread if unread else None,
                 since=since_date,
                 from_addr=from_addr,
+                limit=limit,
             )
             
-            if limit:
-                uids = uids[:limit]
-            
             if pipe:
-                for uid in uids:
-                    click.echo(str(uid))
+                if uids:
+                    sys.stdout.write("\n".join(map(str, uids)))
+                    sys.stdout.write("\n")
+                return
+            
+            if columnar:
+                _emit_columns(client.iter_messages(uids, folder=folder))
                 return
             
-            messages = client.fetch_messages(uids, folder=folder)
+            messages = _released(client.iter_messages(uids, folder=folder))
             
             if output_json:
-                result = [msg.to_dict() for msg in messages.values()]
-                click.echo(json.dumps(result, indent=2))
+                from . import _cache
+
+                account = _cache.account_key(profile_obj)
+                folder_name = folder or profile_obj.folder_inbox
+                uidvalidity = client.uidvalidity(folder)
+                _write_json_array(
+                    _cache.summary_bytes(account, folder_name, uidvalidity, msg) for _, msg in messages
+                )
             else:
-                for uid in uids:
-                    if uid in messages:
-                        msg = messages[uid]
-                        status = "U" if not msg.flags.get("seen") else " "
-                        flagged = "*" if msg.flags.get("flagged") else " "
-                        click.echo(f"{status}{flagged} {uid:6d}  {msg.from_addr:30s}  {msg.subject}")
+                for uid, msg in messages:
+                    click.echo(_ROW_FMT % (
+                        " " if msg.seen else "U",
+                        "*" if msg.flagged else " ",
+                        uid,
+                        msg.from_addr,
+                        msg.subject,
+                    ))
     except Exception as e:
         if not quiet:
             click.echo(f"Error: {e}", err=True)
@@ -383,11 +537,14 @@ def inbox_cmd(profile, host, output_json, quiet, unread, limit, since, from_addr
 @click.option("--from", "from_addr", help="Filter by sender")
 @click.option("--subject", help="Filter by subject")
 @click.option("--raw-imap", help="Raw IMAP search criteria")
-@click.option("--limit", type=int, help="Limit number of results")
+@click.option("--limit", type=int, help="Limit number of results (newest first)")
 @click.option("--folder", help="Folder to search")
 @click.option("--pipe", is_flag=True, help="Output UIDs only")
-def search_cmd(profile, host, output_json, quiet, unread, since, before, from_addr, subject, raw_imap, limit, folder, pipe):
+@click.option("--columnar", is_flag=True, help="JSON with one array per field (implies --json)")
+def search_cmd(profile, host, output_json, quiet, unread, since, before, from_addr, subject, raw_imap, limit, folder, pipe, columnar):
     """Search for messages."""
+    from .keychain import get_password
+
     try:
         profile_obj = get_profile(profile)
         if not profile_obj:
@@ -395,7 +552,7 @@ def search_cmd(profile, host, output_json, quiet, unread, since, before, from_ad
             sys.exit(1)
         
         if host:
-            profile_obj.imap_host = host
+            profile_obj = profile_obj.replace(imap_host=host)
         
         password = get_password(profile_obj.name)
         if not password:
@@ -403,14 +560,7 @@ def search_cmd(profile, host, output_json, quiet, unread, since, before, from_ad
             sys.exit(1)
         
         # Parse dates
-        since_date = None
-        if since:
-            try:
-                days = int(since.rstrip("d"))
-                since_date = datetime.now() - timedelta(days=days)
-            except ValueError:
-                click.echo(f"Invalid --since format: {since}. Use format like '7d' or '30d'.", err=True)
-                sys.exit(1)
+        since_date = _parse_since(since) if since else None
         
         before_date = None
         if before:
@@ -420,7 +570,7 @@ def search_cmd(profile, host, output_json, quiet, unread, since, before, from_ad
                 click.echo(f"Invalid --before format: {before}. Use ISO format like '2024-01-01'.", err=True)
                 sys.exit(1)
         
-        with IMAPClientWrapper(profile_obj, password) as client:
+        with _open_client(profile_obj, password) as client:
             uids = client.search_messages(
                 folder=folder,
                 unread=unread if unread else None,
@@ -429,34 +579,83 @@ def search_cmd(profile, host, output_json, quiet, unread, since, before, from_ad
                 from_addr=from_addr,
                 subject=subject,
                 raw_criteria=raw_imap,
+                limit=limit,
             )
             
-            if limit:
-                uids = uids[:limit]
-            
             if pipe:
-                for uid in uids:
-                    click.echo(str(uid))
+                if uids:
+                    sys.stdout.write("\n".join(map(str, uids)))
+                    sys.stdout.write("\n")
+                return
+            
+            if columnar:
+                _emit_columns(client.iter_messages(uids, folder=folder))
                 return
             
-            messages = client.fetch_messages(uids, folder=folder)
+            messages = _released(client.iter_messages(uids, folder=folder))
             
             if output_json:
-                result = [msg.to_dict() for msg in messages.values()]
-                click.echo(json.dumps(result, indent=2))
+                from . import _cache
+
+                account = _cache.account_key(profile_obj)
+                folder_name = folder or profile_obj.folder_inbox
+                uidvalidity = client.uidvalidity(folder)
+                _write_json_array(
+                    _cache.summary_bytes(account, folder_name, uidvalidity, msg) for _, msg in messages
+                )
             else:
-                for uid in uids:
-                    if uid in messages:
-                        msg = messages[uid]
-                        status = "U" if not msg.flags.get("seen") else " "
-                        flagged = "*" if msg.flags.get("flagged") else " "
-                        click.echo(f"{status}{flagged} {uid:6d}  {msg.from_addr:30s}  {msg.subject}")
+                for uid, msg in messages:
+                    click.echo(_ROW_FMT % (
+                        " " if msg.seen else "U",
+                        "*" if msg.flagged else " ",
+                        uid,
+                        msg.from_addr,
+                        msg.subject,
+                    ))
     except Exception as e:
         if not quiet:
             click.echo(f"Error: {e}", err=True)
         sys.exit(1)
 
 
+# Below this many messages, read parses in-process; worker startup costs more
+_PARALLEL_PARSE_MIN = 8
+
+
+def _parse_and_extract(
+    raw: bytes,
+    with_headers: bool = True,
+) -> Tuple[Optional[str], Optional[List[Tuple[str, str]]], Optional[str], Optional[str], List[AttachmentInfo]]:
+    """Parse a raw message into (message_id, headers, plain, html, attachments).
+
+    Headers are decoded only if with_headers, since that touches every header.
+    Top-level and picklable so it can run in a worker process.
+    """
+    from .parse import parse_message, extract_all
+
+    message = parse_message(raw)
+    message_id = message.get("Message-ID")
+    plain, html, attachments = extract_all(message)
+    return (
+        str(message_id) if message_id is not None else None,
+        [(key, str(value)) for key, value in message.items()] if with_headers else None,
+        plain,
+        html,
+        attachments,
+    )
+
+
+def _extract_messages(raws: List[bytes], with_headers: bool = True) -> List[tuple]:
+    """Run _parse_and_extract over raws, in a process pool for large batches."""
+    extract = functools.partial(_parse_and_extract, with_headers=with_headers)
+    if len(raws) < _PARALLEL_PARSE_MIN:
+        return [extract(raw) for raw in raws]
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor() as executor:
+        return list(executor.map(extract, raws, chunksize=4))
+
+
 # Read message
 @cli.command("read")
 @add_global_options
@@ -468,6 +667,9 @@ def search_cmd(profile, host, output_json, quiet, unread, since, before, from_ad
 @click.option("--folder", help="Folder to read from")
 def read_cmd(profile, host, output_json, quiet, uid, headers, body, attachments, out, folder):
     """Read a message. UID can be provided as argument or read from stdin (one per line)."""
+    from .keychain import get_password
+    from .parse import parse_message, get_attachments, get_attachment_content
+
     try:
         # Read UIDs from stdin if not provided
         uids_to_read = []
@@ -476,15 +678,12 @@ def read_cmd(profile, host, output_json, quiet, uid, headers, body, attachments,
         else:
             # Try to read from stdin
             if not sys.stdin.isatty():
-                for line in sys.stdin:
-                    line = line.strip()
-                    if line:
-                        try:
-                            uids_to_read.append(int(line))
-                        except ValueError:
-                            if not quiet:
-                                click.echo(f"Invalid UID: {line}", err=True)
-                            continue
+                for tok in sys.stdin.buffer.read().split():
+                    try:
+                        uids_to_read.append(int(tok))
+                    except ValueError:
+                        if not quiet:
+                            click.echo(f"Invalid UID: {tok.decode(errors='replace')}", err=True)
             else:
                 click.echo("Error: UID required (provide as argument or pipe from stdin)", err=True)
                 sys.exit(1)
@@ -499,35 +698,37 @@ def read_cmd(profile, host, output_json, quiet, uid, headers, body, attachments,
             sys.exit(1)
         
         if host:
-            profile_obj.imap_host = host
+            profile_obj = profile_obj.replace(imap_host=host)
         
         password = get_password(profile_obj.name)
         if not password:
             click.echo("No password stored. Use 'anymail auth set' first.", err=True)
             sys.exit(1)
         
-        with IMAPClientWrapper(profile_obj, password) as client:
+        with _open_client(profile_obj, password) as client:
+            raw_by_uid = client.fetch_raw_messages(uids_to_read, folder=folder)
+            # Missing UIDs are reported after the rest of the batch is printed
+            found = [uid for uid in uids_to_read if uid in raw_by_uid]
+            missing = [uid for uid in uids_to_read if uid not in raw_by_uid]
+            
+            extracted = None
+            if attachments != "save":
+                # Headers are only printed by the default view (not --body, not --attachments list)
+                with_headers = attachments is None and (output_json or not body)
+                extracted = _extract_messages(
+                    [raw_by_uid[uid] for uid in found], with_headers=with_headers
+                )
+            
             # Process each UID
-            for uid in uids_to_read:
+            for i, uid in enumerate(found):
                 if len(uids_to_read) > 1 and not output_json:
                     click.echo(f"\n--- Message {uid} ---\n")
                 
-                raw_message = client.fetch_message(uid, folder=folder)
-                message = parse_message(raw_message)
-                
-                if attachments == "list":
-                    atts = get_attachments(message)
-                    if output_json:
-                        click.echo(json.dumps([att.to_dict() for att in atts], indent=2))
-                    else:
-                        for att in atts:
-                            click.echo(f"{att.filename or '(no filename)'}  {att.content_type}  {att.size} bytes")
-                    continue
-                
                 if attachments == "save":
                     if not out:
                         click.echo("--out required when saving attachments", err=True)
                         sys.exit(1)
+                    message = parse_message(raw_by_uid[uid])
                     out_path = Path(out)
                     out_path.mkdir(parents=True, exist_ok=True)
                     atts = get_attachments(message)
@@ -536,11 +737,20 @@ def read_cmd(profile, host, output_json, quiet, uid, headers, body, attachments,
                         if content:
                             filename = att.filename or f"attachment_{att.content_id or 'unknown'}"
                             filepath = out_path / filename
-                            with open(filepath, "wb") as f:
-                                f.write(content)
+                            filepath.write_bytes(content)
                             click.echo(f"Saved: {filepath}")
                     continue
                 
+                message_id, msg_headers, plain, html, atts = extracted[i]
+                
+                if attachments == "list":
+                    if output_json:
+                        _emit_json(atts)
+                    else:
+                        for att in atts:
+                            click.echo(f"{att.filename or '(no filename)'}  {att.content_type}  {att.size} bytes")
+                    continue
+                
                 # Default: show headers and body
                 show_headers = not body
                 show_body = not headers
@@ -548,33 +758,36 @@ def read_cmd(profile, host, output_json, quiet, uid, headers, body, attachments,
                 if output_json:
                     result = {
                         "uid": uid,
-                        "message_id": message.get("Message-ID"),
-                        "headers": dict(message.items()),
-                        "body_plain": get_plaintext_body(message),
-                        "body_html": get_html_body(message),
-                        "attachments": [att.to_dict() for att in get_attachments(message)],
+                        "message_id": message_id,
+                        "headers": dict(msg_headers),
+                        "body_plain": plain,
+                        "body_html": html,
+                        "attachments": atts,
                     }
-                    click.echo(json.dumps(result, indent=2))
+                    _emit_json(result)
                 else:
                     if show_headers:
                         click.echo("Headers:")
                         click.echo("-" * 80)
-                        for key, value in message.items():
+                        for key, value in msg_headers:
                             click.echo(f"{key}: {value}")
                         click.echo("-" * 80)
                     
                     if show_body:
-                        plain = get_plaintext_body(message)
                         if plain:
                             click.echo("\nBody:")
                             click.echo("-" * 80)
                             click.echo(plain)
-                        else:
-                            html = get_html_body(message)
-                            if html:
-                                click.echo("\nBody (HTML):")
-                                click.echo("-" * 80)
-                                click.echo(html)
+                        elif html:
+                            click.echo("\nBody (HTML):")
+                            click.echo("-" * 80)
+                            click.echo(html)
+        
+        if missing:
+            if not quiet:
+                for uid in missing:
+                    click.echo(f"Error: Message {uid} not found", err=True)
+            sys.exit(1)
     except Exception as e:
         if not quiet:
             click.echo(f"Error: {e}", err=True)
@@ -584,14 +797,16 @@ def read_cmd(profile, host, output_json, quiet, uid, headers, body, attachments,
 # Flag management
 @cli.command("flag")
 @add_global_options
-@click.argument("uid", type=int)
+@click.argument("uids", metavar="UID...", type=int, nargs=-1, required=True)
 @click.option("--seen", type=bool, help="Set seen flag")
 @click.option("--star", type=bool, help="Set starred/flagged flag")
 @click.option("--archive", is_flag=True, help="Archive message (remove from INBOX)")
 @click.option("--trash", is_flag=True, help="Move to trash")
 @click.option("--folder", help="Folder containing the message")
-def flag_cmd(profile, host, output_json, quiet, uid, seen, star, archive, trash, folder):
-    """Set flags on a message."""
+def flag_cmd(profile, host, output_json, quiet, uids, seen, star, archive, trash, folder):
+    """Set flags on one or more messages (one IMAP command per change)."""
+    from .keychain import get_password
+
     try:
         profile_obj = get_profile(profile)
         if not profile_obj:
@@ -599,34 +814,38 @@ def flag_cmd(profile, host, output_json, quiet, uid, seen, star, archive, trash,
             sys.exit(1)
         
         if host:
-            profile_obj.imap_host = host
+            profile_obj = profile_obj.replace(imap_host=host)
         
         password = get_password(profile_obj.name)
         if not password:
             click.echo("No password stored. Use 'anymail auth set' first.", err=True)
             sys.exit(1)
         
-        with IMAPClientWrapper(profile_obj, password) as client:
+        uids = list(uids)
+        noun = "message" if len(uids) == 1 else "messages"
+        label = f"{noun} {', '.join(map(str, uids))}"
+        
+        with _open_client(profile_obj, password) as client:
             if archive:
-                client.archive_message(uid, folder=folder)
-                click.echo(f"Message {uid} archived.")
+                client.archive_messages(uids, folder=folder)
+                click.echo(f"{label.capitalize()} archived.")
             elif trash:
-                client.delete_message(uid, folder=folder)
-                click.echo(f"Message {uid} moved to trash.")
+                client.delete_message(uids, folder=folder)
+                click.echo(f"{label.capitalize()} moved to trash.")
             else:
                 if seen is not None:
                     if seen:
-                        client.set_flags(uid, ["\\Seen"], folder=folder)
+                        client.set_flags(uids, ["\\Seen"], folder=folder)
                     else:
-                        client.remove_flags(uid, ["\\Seen"], folder=folder)
+                        client.remove_flags(uids, ["\\Seen"], folder=folder)
                 
                 if star is not None:
                     if star:
-                        client.set_flags(uid, ["\\Flagged"], folder=folder)
+                        client.set_flags(uids, ["\\Flagged"], folder=folder)
                     else:
-                        client.remove_flags(uid, ["\\Flagged"], folder=folder)
+                        client.remove_flags(uids, ["\\Flagged"], folder=folder)
                 
-                click.echo(f"Flags updated for message {uid}.")
+                click.echo(f"Flags updated for {label}.")
     except Exception as e:
         if not quiet:
             click.echo(f"Error: {e}", err=True)
@@ -643,6 +862,9 @@ def flag_cmd(profile, host, output_json, quiet, uid, seen, star, archive, trash,
 @click.option("--folder", help="Folder containing the message")
 def reply_cmd(profile, host, output_json, quiet, uid, to_all, include_quote, format, folder):
     """Get reply information for a message."""
+    from .keychain import get_password
+    from .parse import parse_message, get_plaintext_body, get_reply_headers, format_addresses
+
     try:
         profile_obj = get_profile(profile)
         if not profile_obj:
@@ -650,14 +872,14 @@ def reply_cmd(profile, host, output_json, quiet, uid, to_all, include_quote, for
             sys.exit(1)
         
         if host:
-            profile_obj.imap_host = host
+            profile_obj = profile_obj.replace(imap_host=host)
         
         password = get_password(profile_obj.name)
         if not password:
             click.echo("No password stored. Use 'anymail auth set' first.", err=True)
             sys.exit(1)
         
-        with IMAPClientWrapper(profile_obj, password) as client:
+        with _open_client(profile_obj, password) as client:
             raw_message = client.fetch_message(uid, folder=folder)
             message = parse_message(raw_message)
             
@@ -690,7 +912,7 @@ def reply_cmd(profile, host, output_json, quiet, uid, to_all, include_quote, for
             }
             
             if format == "json" or output_json:
-                click.echo(json.dumps(result, indent=2))
+                _emit_json(result)
             else:
                 click.echo(f"To: {result['to']}")
                 if result["cc"]:
@@ -718,6 +940,9 @@ def reply_cmd(profile, host, output_json, quiet, uid, to_all, include_quote, for
 @click.option("--dry-run", is_flag=True, help="Print MIME without sending")
 def send_cmd(profile, host, output_json, quiet, to, cc, bcc, subject, body, attach, dry_run):
     """Send an email."""
+    from .keychain import get_password
+    from .smtp import send_email
+
     try:
         profile_obj = get_profile(profile)
         if not profile_obj:
@@ -725,7 +950,7 @@ def send_cmd(profile, host, output_json, quiet, to, cc, bcc, subject, body, atta
             sys.exit(1)
         
         if host:
-            profile_obj.smtp_host = host
+            profile_obj = profile_obj.replace(smtp_host=host)
         
         password = get_password(profile_obj.name)
         if not password:
@@ -758,11 +983,46 @@ def send_cmd(profile, host, output_json, quiet, to, cc, bcc, subject, body, atta
         sys.exit(1)
 
 
+# How long a successful keyring self-test is trusted (doctor.json)
+_KEYRING_CHECK_TTL = 24 * 60 * 60
+
+
+def _keyring_error() -> Optional[str]:
+    """Round-trip a test secret through the keyring. Returns None if it works, else the error.
+
+    Successes are remembered in doctor.json for a day since the check can trigger OS prompts.
+    """
+    cache_path = get_config_dir() / "doctor.json"
+    try:
+        state = orjson.loads(cache_path.read_bytes())
+        if state["keyring_ok"] and time.time() - state["ts"] < _KEYRING_CHECK_TTL:
+            return None
+    except (OSError, orjson.JSONDecodeError, KeyError, TypeError):
+        pass
+    
+    try:
+        import keyring
+        keyring.set_password("anymail", "__test__", "test")
+        keyring.delete_password("anymail", "__test__")
+    except Exception as e:
+        return str(e)
+    
+    try:
+        ensure_config_dir()
+        cache_path.write_bytes(orjson.dumps({"keyring_ok": True, "ts": time.time()}))
+    except OSError:
+        pass
+    return None
+
+
 # Doctor command
 @cli.command("doctor")
 @add_global_options
 def doctor_cmd(profile, host, output_json, quiet):
     """Check system health."""
+    from .keychain import get_password
+    from .imap import IMAPClientWrapper
+
     issues = []
     
     # Check config
@@ -776,14 +1036,11 @@ def doctor_cmd(profile, host, output_json, quiet):
         issues.append(f"Config error: {e}")
     
     # Check keyring
-    try:
-        import keyring
-        test_key = "anymail:__test__"
-        keyring.set_password("anymail", "__test__", "test")
-        keyring.delete_password("anymail", "__test__")
+    keyring_error = _keyring_error()
+    if keyring_error is None:
         click.echo("✓ Keyring accessible")
-    except Exception as e:
-        issues.append(f"Keyring error: {e}")
+    else:
+        issues.append(f"Keyring error: {keyring_error}")
     
     # Check profile and connection
     try:
@@ -832,6 +1089,21 @@ def doctor_cmd(profile, host, output_json, quiet):
         click.echo("\n✓ All checks passed")
 
 
+# IMAP connection daemon
+@cli.command("daemon")
+@click.option("--idle-timeout", type=int, default=600, help="Exit after this many idle seconds (default 600)")
+def daemon_cmd(idle_timeout):
+    """Keep IMAP connections open for other commands (Unix only)."""
+    from . import daemon
+
+    try:
+        click.echo(f"Listening on {daemon.get_socket_path()}", err=True)
+        daemon.serve(idle_timeout=idle_timeout)
+    except RuntimeError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+
 # Logs (agent monitoring)
 @cli.group("logs")
 def logs_group():
@@ -860,7 +1132,7 @@ def logs_list(since, until, command, outcome, profile, limit, output_json):
         limit=limit,
     )
     if output_json:
-        click.echo(json.dumps(rows, indent=2))
+        _emit_json([dict(r) for r in rows])
         return
     if not rows:
         click.echo("No log entries found.")
@@ -878,9 +1150,10 @@ def logs_list(since, until, command, outcome, profile, limit, output_json):
 @click.option("--outcome", type=click.Choice(["success", "error"]), help="Filter by outcome")
 @click.option("--profile", help="Filter by profile")
 @click.option("--limit", type=int, default=100, help="Max entries (default 100)")
-@click.option("--offset", type=int, default=0, help="Offset for pagination")
+@click.option("--cursor", type=int, help="Only entries older than this log id (the last id of the previous page)")
+@click.option("--offset", type=int, default=0, help="Offset for pagination (slow for deep pages; prefer --cursor)")
 @click.option("--json", "output_json", is_flag=True, help="Output JSON")
-def logs_query(since, until, command, outcome, profile, limit, offset, output_json):
+def logs_query(since, until, command, outcome, profile, limit, cursor, offset, output_json):
     """Query CLI logs with filters (same as list with pagination and JSON)."""
     since_dt = _parse_date_option(since) if since else None
     until_dt = _parse_date_option(until) if until else None
@@ -892,9 +1165,10 @@ def logs_query(since, until, command, outcome, profile, limit, offset, output_js
         profile=profile,
         limit=limit,
         offset=offset,
+        before_id=cursor,
     )
     if output_json:
-        click.echo(json.dumps(rows, indent=2))
+        _emit_json([dict(r) for r in rows])
         return
     if not rows:
         click.echo("No log entries found.")
@@ -902,10 +1176,21 @@ def logs_query(since, until, command, outcome, profile, limit, offset, output_js
     for r in rows:
         err = f"  error: {r['error_message']}" if r["error_message"] else ""
         dur = f"  {r['duration_ms']}ms" if r["duration_ms"] is not None else ""
-        args = r.get("args_json") or ""
+        args = r["args_json"] or ""
         if len(args) > 60:
             args = args[:57] + "..."
         click.echo(f"{r['id']}  {r['ts']}  {r['command']:20s}  {r['outcome']:7s}  {r['profile'] or '-'}  {dur}  {args}{err}")
+    if len(rows) == limit:
+        click.echo(f"Next page: --cursor {rows[-1]['id']}", err=True)
+
+
+def _parse_since(s: str) -> datetime:
+    """Parse inbox/search --since: a day count like 7d (or bare 7)."""
+    m = _RELATIVE_DAYS.match(s.strip())
+    if not m:
+        click.echo(f"Invalid --since format: {s}. Use format like '7d' or '30d'.", err=True)
+        sys.exit(1)
+    return datetime.now() - timedelta(days=int(m.group(1)))
 
 
 def _parse_date_option(s: str) -> Optional[datetime]:
@@ -913,7 +1198,7 @@ def _parse_date_option(s: str) -> Optional[datetime]:
     if not s:
         return None
     s = s.strip().lower()
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc)
     if s.endswith("d"):
         try:
             days = int(s[:-1])
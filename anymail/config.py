@@ -1,9 +1,12 @@
 """Configuration management for AnyMail."""
 
-import json
+import functools
 import os
 from pathlib import Path
 from typing import Dict, Optional
+
+import orjson
+
 from .types import Profile
 
 
@@ -31,21 +34,34 @@ def ensure_config_dir() -> None:
 
 
 def load_config() -> Dict[str, Profile]:
-    """Load profiles from config file."""
+    """Load profiles from config file.
+    
+    Parsed profiles are memoized per (path, mtime, size), so repeated calls in
+    one invocation cost a stat(). Callers get their own dict but share the
+    Profile objects, which must not be mutated (use Profile.replace).
+    """
     config_path = get_config_path()
-    if not config_path.exists():
+    try:
+        st = config_path.stat()
+    except FileNotFoundError:
         return {}
     
+    return dict(_load_profiles(str(config_path), st.st_mtime_ns, st.st_size))
+
+
+@functools.lru_cache(maxsize=4)
+def _load_profiles(path: str, mtime_ns: int, size: int) -> Dict[str, Profile]:
+    """Read and parse the config file; cached per (path, mtime, size)."""
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
         
         profiles = {}
         for name, profile_data in data.get("profiles", {}).items():
             profiles[name] = Profile.from_dict(profile_data)
         
         return profiles
-    except (json.JSONDecodeError, KeyError, ValueError) as e:
+    except (orjson.JSONDecodeError, KeyError, ValueError) as e:
         raise ValueError(f"Invalid config file: {e}")
 
 
@@ -58,8 +74,9 @@ def save_config(profiles: Dict[str, Profile]) -> None:
         "profiles": {name: profile.to_dict() for name, profile in profiles.items()}
     }
     
-    with open(config_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with open(config_path, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    _load_profiles.cache_clear()
 
 
 def get_profile(name: Optional[str] = None) -> Optional[Profile]:
@@ -0,0 +1,349 @@
+"""Optional long-running IMAP connection daemon.
+
+`anymail daemon` keeps one logged-in IMAP connection per profile and serves
+requests from CLI invocations over a Unix socket, so scripted use (e.g.
+`anymail inbox --pipe | xargs anymail read`) pays TLS + LOGIN once instead of
+per command. CLI commands fall back to a direct connection when no daemon is
+listening (and always on platforms without Unix sockets).
+
+Protocol: 4-byte big-endian length prefix + orjson payload, in both directions.
+Request:  {"cmd": <method>, "profile": <profile dict>, "args": [...], "kwargs": {...}}
+Response: {"ok": true, "result": ...} or {"ok": false, "error": <message>}
+"""
+
+from __future__ import annotations
+
+import base64
+import imaplib
+import os
+import socket
+import struct
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import orjson
+
+from .config import get_config_dir, ensure_config_dir
+from .types import MessageSummary, Profile
+
+# asyncio is only needed to serve; CLI commands import this module to connect
+if TYPE_CHECKING:
+    import asyncio
+
+_HEADER = struct.Struct(">I")
+
+# IMAPClientWrapper methods the daemon will run on a client's behalf
+_METHODS = frozenset({
+    "search_messages",
+    "fetch_messages",
+    "fetch_raw_messages",
+    "fetch_message",
+    "set_flags",
+    "remove_flags",
+    "move_message",
+    "copy_message",
+    "delete_message",
+    "archive_message",
+    "archive_messages",
+    "list_folders",
+    "uidvalidity",
+})
+
+# search_messages kwargs that travel as ISO strings
+_DATETIME_KWARGS = ("since", "before")
+
+DEFAULT_IDLE_TIMEOUT = 600
+
+
+def get_socket_path() -> Path:
+    """Path to the daemon's Unix socket."""
+    return get_config_dir() / "sock"
+
+
+def is_supported() -> bool:
+    """Whether this platform can run the daemon (needs Unix sockets)."""
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    import asyncio
+
+    return hasattr(asyncio, "start_unix_server")
+
+
+# Result encoding: only fetch results need help to cross the JSON boundary
+
+def _encode_summaries(summaries: Dict[int, MessageSummary]) -> List[list]:
+    rows = []
+    for m in summaries.values():
+        rows.append([m.uid, m.message_id, m.from_addr, m.to, m.subject, m.date, m.snippet, m.flags])
+        m.release()
+    return rows
+
+
+def _decode_summaries(rows: List[list]) -> Dict[int, MessageSummary]:
+    summaries = {}
+    for uid, message_id, from_addr, to, subject, date, snippet, flags in rows:
+        summaries[uid] = MessageSummary.acquire(
+            uid=uid,
+            message_id=message_id,
+            from_addr=from_addr,
+            to=to,
+            subject=subject,
+            date=datetime.fromisoformat(date),
+            snippet=snippet,
+            flags=flags,
+        )
+    return summaries
+
+
+def _encode_raw(messages: Dict[int, bytes]) -> List[list]:
+    return [[uid, base64.b64encode(raw).decode("ascii")] for uid, raw in messages.items()]
+
+
+def _decode_raw(rows: List[list]) -> Dict[int, bytes]:
+    return {uid: base64.b64decode(raw) for uid, raw in rows}
+
+
+_ENCODERS = {
+    "fetch_messages": _encode_summaries,
+    "fetch_raw_messages": _encode_raw,
+    "fetch_message": lambda raw: base64.b64encode(raw).decode("ascii"),
+}
+_DECODERS = {
+    "fetch_messages": _decode_summaries,
+    "fetch_raw_messages": _decode_raw,
+    "fetch_message": base64.b64decode,
+}
+
+
+# Server
+
+class _Daemon:
+    """Holds one IMAP connection per profile and serializes access to it."""
+
+    def __init__(self, idle_timeout: int):
+        self.idle_timeout = idle_timeout
+        self.clients: Dict[Tuple, Any] = {}
+        self.locks: Dict[Tuple, asyncio.Lock] = {}
+        self.last_activity = 0.0
+
+    def _connect(self, profile: Profile):
+        from .imap import IMAPClientWrapper
+        from .keychain import get_password
+
+        # Bypass the cache: the daemon outlives password changes made by `auth set`
+        password = get_password(profile.name, use_cache=False)
+        if not password:
+            raise ValueError("No password stored. Use 'anymail auth set' first.")
+        client = IMAPClientWrapper(profile, password)
+        client.connect()
+        return client
+
+    def _call(self, key: Tuple, profile: Profile, cmd: str, args: list, kwargs: dict) -> Any:
+        """Run cmd on the profile's connection, reconnecting once if it went stale."""
+        for attempt in (0, 1):
+            client = self.clients.get(key)
+            if client is None:
+                client = self.clients[key] = self._connect(profile)
+            try:
+                return getattr(client, cmd)(*args, **kwargs)
+            except (imaplib.IMAP4.abort, OSError):
+                self.clients.pop(key, None)
+                client.disconnect()
+                if attempt:
+                    raise
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                    request = orjson.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    break
+                self.last_activity = loop.time()
+                try:
+                    cmd = request["cmd"]
+                    if cmd not in _METHODS:
+                        raise ValueError(f"Unknown daemon command: {cmd}")
+                    profile_data = request["profile"]
+                    profile = Profile.from_dict(profile_data)
+                    kwargs = request.get("kwargs") or {}
+                    for name in _DATETIME_KWARGS:
+                        if kwargs.get(name):
+                            kwargs[name] = datetime.fromisoformat(kwargs[name])
+                    key = tuple(sorted(profile_data.items()))
+                    lock = self.locks.setdefault(key, asyncio.Lock())
+                    async with lock:
+                        result = await loop.run_in_executor(
+                            None, self._call, key, profile, cmd, request.get("args") or [], kwargs
+                        )
+                    encode = _ENCODERS.get(cmd)
+                    response = {"ok": True, "result": encode(result) if encode else result}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                payload = orjson.dumps(response)
+                writer.write(_HEADER.pack(len(payload)) + payload)
+                await writer.drain()
+                self.last_activity = loop.time()
+        finally:
+            writer.close()
+
+    async def serve(self, path: Path) -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        self.last_activity = loop.time()
+        # Owner-only from the moment it is bound: a chmod afterwards leaves a window
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle, path=str(path))
+        finally:
+            os.umask(old_umask)
+        try:
+            async with server:
+                while loop.time() - self.last_activity < self.idle_timeout:
+                    await asyncio.sleep(min(self.idle_timeout, 30))
+        finally:
+            for client in self.clients.values():
+                client.disconnect()
+            self.clients.clear()
+
+
+def serve(idle_timeout: int = DEFAULT_IDLE_TIMEOUT) -> None:
+    """Run the daemon in the foreground until idle for idle_timeout seconds."""
+    if not is_supported():
+        raise RuntimeError("The daemon needs Unix domain sockets, which this platform lacks.")
+    ensure_config_dir()
+    path = get_socket_path()
+    if daemon_running():
+        raise RuntimeError(f"A daemon is already listening on {path}")
+    path.unlink(missing_ok=True)
+    try:
+        import asyncio
+
+        asyncio.run(_Daemon(idle_timeout).serve(path))
+    finally:
+        path.unlink(missing_ok=True)
+
+
+# Client
+
+class DaemonClient:
+    """IMAPClientWrapper stand-in that forwards calls to a running daemon."""
+
+    def __init__(self, profile: Profile, sock: socket.socket):
+        self.profile = profile
+        self._profile_data = profile.to_dict()
+        self._sock = sock
+        self._file = sock.makefile("rb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def _request(self, cmd: str, *args: Any, **kwargs: Any) -> Any:
+        payload = orjson.dumps({
+            "cmd": cmd,
+            "profile": self._profile_data,
+            "args": list(args),
+            "kwargs": kwargs,
+        })
+        self._sock.sendall(_HEADER.pack(len(payload)) + payload)
+        header = self._file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ConnectionError("Daemon closed the connection")
+        (length,) = _HEADER.unpack(header)
+        response = orjson.loads(self._file.read(length))
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        decode = _DECODERS.get(cmd)
+        return decode(response["result"]) if decode else response["result"]
+
+    def search_messages(self, **kwargs: Any) -> List[int]:
+        return self._request("search_messages", **kwargs)
+
+    def fetch_messages(
+        self, uids: List[int], folder: Optional[str] = None, fetch_body: bool = False
+    ) -> Dict[int, MessageSummary]:
+        return self._request("fetch_messages", list(uids), folder=folder, fetch_body=fetch_body)
+
+    def iter_messages(
+        self, uids: List[int], folder: Optional[str] = None, fetch_body: bool = False
+    ) -> Iterator[Tuple[int, MessageSummary]]:
+        return iter(self.fetch_messages(uids, folder=folder, fetch_body=fetch_body).items())
+
+    def fetch_raw_messages(self, uids: List[int], folder: Optional[str] = None) -> Dict[int, bytes]:
+        return self._request("fetch_raw_messages", list(uids), folder=folder)
+
+    def fetch_message(self, uid: int, folder: Optional[str] = None) -> bytes:
+        return self._request("fetch_message", uid, folder=folder)
+
+    def set_flags(self, uids: Union[int, List[int]], flags: List[str], folder: Optional[str] = None) -> None:
+        self._request("set_flags", uids, flags, folder=folder)
+
+    def remove_flags(self, uids: Union[int, List[int]], flags: List[str], folder: Optional[str] = None) -> None:
+        self._request("remove_flags", uids, flags, folder=folder)
+
+    def move_message(self, uids: Union[int, List[int]], destination_folder: str, folder: Optional[str] = None) -> None:
+        self._request("move_message", uids, destination_folder, folder=folder)
+
+    def copy_message(self, uids: Union[int, List[int]], destination_folder: str, folder: Optional[str] = None) -> None:
+        self._request("copy_message", uids, destination_folder, folder=folder)
+
+    def delete_message(self, uids: Union[int, List[int]], folder: Optional[str] = None) -> None:
+        self._request("delete_message", uids, folder=folder)
+
+    def archive_message(self, uid: int, folder: Optional[str] = None) -> None:
+        self._request("archive_message", uid, folder=folder)
+
+    def archive_messages(self, uids: List[int], folder: Optional[str] = None) -> None:
+        self._request("archive_messages", list(uids), folder=folder)
+
+    def list_folders(self) -> List[str]:
+        return self._request("list_folders")
+
+    def uidvalidity(self, folder: Optional[str] = None) -> Optional[int]:
+        return self._request("uidvalidity", folder=folder)
+
+
+def _open_socket() -> Optional[socket.socket]:
+    # Connecting only needs Unix sockets; is_supported() also checks asyncio
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = get_socket_path()
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def daemon_running() -> bool:
+    """Whether a daemon is accepting connections on the socket."""
+    sock = _open_socket()
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def connect(profile: Profile) -> Optional[DaemonClient]:
+    """Connect to a running daemon, or return None if there is none."""
+    sock = _open_socket()
+    if sock is None:
+        return None
+    return DaemonClient(profile, sock)
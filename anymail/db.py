@@ -1,19 +1,42 @@
-"""SQLite database for CLI invocation logging (agent monitoring)."""
+"""SQLite database for CLI invocation logging (agent monitoring) and the message summary cache."""
 
-import json
+import atexit
+import queue
 import sqlite3
+import threading
 import time
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, Iterator, List, Optional
 
+import orjson
+
 from .config import get_config_dir, ensure_config_dir
 
-# Sensitive option names: their values are redacted in stored argv
-_SENSITIVE_OPTIONS = frozenset({"--body", "-b", "--attach", "--password", "-p"})
-# -p is profile, not password; password is from getpass. So only --body and --attach content redact.
-# Actually -p is profile. So sensitive: --body, --attach (we can store filenames or redact; redact to be safe).
+# Options whose values are redacted in stored argv (message text, attachment
+# paths). Passwords never appear in argv: they come from getpass.
+_SENSITIVE_OPTIONS = frozenset({"--body", "--attach"})
+_SENSITIVE_PREFIXES = tuple(f"{opt}=" for opt in _SENSITIVE_OPTIONS)
+
+# Bump when the schema changes; stored in PRAGMA user_version
+_SCHEMA_VERSION = 3
+_initialized = False
+_conn: Optional[sqlite3.Connection] = None
+_close_registered = False
+
+# Log rows waiting to be written by the background writer (see _write_loop).
+# It commits up to _BATCH_SIZE rows at a time, waiting at most _BATCH_WINDOW
+# seconds for a batch to fill; _flush() drains the rest (also at exit, via _close).
+_log_queue: "queue.Queue[Any]" = queue.Queue()
+# Queued by _flush(): the writer commits the batch it holds without waiting
+# out the rest of _BATCH_WINDOW
+_FLUSH = object()
+_BATCH_SIZE = 32
+_BATCH_WINDOW = 0.05
+_writer: Optional[threading.Thread] = None
+# Serializes use of the shared connection between the writer and queries
+_db_lock = threading.Lock()
 
 
 def get_db_path() -> Path:
@@ -22,16 +45,53 @@ def get_db_path() -> Path:
 
 
 def _get_connection() -> sqlite3.Connection:
-    ensure_config_dir()
-    path = get_db_path()
-    conn = sqlite3.connect(str(path), timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """The process-wide log connection, opened on first use.
+    
+    Autocommit mode: writers wrap their statements in explicit transactions.
+    """
+    global _conn
+    if _conn is None:
+        # Everything below (mkdir probe, open, PRAGMA) runs once per process
+        ensure_config_dir()
+        conn = sqlite3.connect(
+            str(get_db_path()), timeout=10.0, check_same_thread=False, isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        # WAL makes NORMAL durable enough; skips the fsync on every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _conn = conn
+        _register_close()
+    return _conn
+
+
+def _register_close() -> None:
+    global _close_registered
+    if not _close_registered:
+        atexit.register(_close)
+        _close_registered = True
+
+
+def _close() -> None:
+    """Write pending log entries and close the connection (runs at exit)."""
+    global _conn, _initialized
+    _flush()
+    with _db_lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+            _initialized = False
 
 
 def init_db() -> None:
     """Create the log table if it does not exist."""
-    with _get_connection() as conn:
+    global _initialized
+    if _initialized:
+        return
+    conn = _get_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # journal_mode is persistent in the database file
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("""
             CREATE TABLE IF NOT EXISTS cli_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,26 +107,46 @@ def init_db() -> None:
         conn.execute(
             "CREATE INDEX IF NOT EXISTS idx_cli_logs_ts ON cli_logs(ts)"
         )
+    if version < 2:
+        # Composite indexes for the logs list/query filters; the single-column
+        # command/outcome indexes they replace only ever served one filter
         conn.execute(
-            "CREATE INDEX IF NOT EXISTS idx_cli_logs_command ON cli_logs(command)"
+            "CREATE INDEX IF NOT EXISTS idx_cli_logs_cmd_out_ts ON cli_logs(command, outcome, ts DESC)"
         )
         conn.execute(
-            "CREATE INDEX IF NOT EXISTS idx_cli_logs_outcome ON cli_logs(outcome)"
+            "CREATE INDEX IF NOT EXISTS idx_cli_logs_profile_ts ON cli_logs(profile, ts DESC)"
         )
+        conn.execute("DROP INDEX IF EXISTS idx_cli_logs_command")
+        conn.execute("DROP INDEX IF EXISTS idx_cli_logs_outcome")
+    if version < 3:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS msg_envelope_cache (
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                uid INTEGER NOT NULL,
+                envelope_json TEXT NOT NULL,
+                PRIMARY KEY (account, folder, uidvalidity, uid)
+            ) WITHOUT ROWID
+        """)
+    if version < _SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+    _initialized = True
 
 
 def sanitize_argv(argv: List[str]) -> List[str]:
     """Redact sensitive values in argv (e.g. --body content, attachment paths)."""
     out: List[str] = []
-    i = 0
-    sensitive_flags = frozenset({"--body", "--attach"})
-    while i < len(argv):
-        arg = argv[i]
-        out.append(arg)
-        if arg in sensitive_flags and i + 1 < len(argv):
-            out.append("[REDACTED]")
-            i += 1
-        i += 1
+    args = iter(argv)
+    for arg in args:
+        if arg in _SENSITIVE_OPTIONS:
+            out.append(arg)
+            if next(args, None) is not None:
+                out.append("[REDACTED]")
+        elif arg.startswith(_SENSITIVE_PREFIXES):
+            out.append(arg[:arg.index("=") + 1] + "[REDACTED]")
+        else:
+            out.append(arg)
     return out
 
 
@@ -77,20 +157,104 @@ def insert_log(
     outcome: str = "success",
     error_message: Optional[str] = None,
     duration_ms: Optional[int] = None,
-) -> int:
-    """Insert a log entry. Returns row id."""
-    init_db()
-    ts = datetime.utcnow().isoformat() + "Z"
-    with _get_connection() as conn:
-        cur = conn.execute(
-            """
-            INSERT INTO cli_logs (ts, command, args_json, profile, outcome, error_message, duration_ms)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (ts, command, args_json, profile, outcome, error_message, duration_ms),
-        )
+) -> None:
+    """Queue a log entry for the background writer; never blocks on SQLite."""
+    ts = datetime.now(timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z")
+    _log_queue.put((ts, command, args_json, profile, outcome, error_message, duration_ms))
+    _ensure_writer()
+
+
+def _ensure_writer() -> None:
+    """Start the writer thread if it is not running (first use, or after a fork)."""
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    _register_close()
+    try:
+        _writer = threading.Thread(target=_write_loop, name="anymail-log-writer", daemon=True)
+        _writer.start()
+    except RuntimeError:
+        # Can't start threads (e.g. during interpreter shutdown): write inline
+        _flush()
+
+
+def _write_loop() -> None:
+    while True:
+        rows: List[tuple] = []
+        taken = 0
+        deadline = None
+        while len(rows) < _BATCH_SIZE:
+            try:
+                if deadline is None:
+                    item = _log_queue.get()
+                    deadline = time.monotonic() + _BATCH_WINDOW
+                else:
+                    item = _log_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            taken += 1
+            if item is _FLUSH:
+                break
+            rows.append(item)
+        try:
+            if rows:
+                _write_rows(rows)
+        except Exception:
+            pass  # Logging must never take the CLI down; drop the batch
+        finally:
+            for _ in range(taken):
+                _log_queue.task_done()
+
+
+def _write_rows(rows: List[tuple]) -> None:
+    """Insert log rows in a single transaction."""
+    with _db_lock:
+        init_db()
+        conn = _get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                """
+                INSERT INTO cli_logs (ts, command, args_json, profile, outcome, error_message, duration_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        except BaseException:
+            conn.rollback()
+            raise
         conn.commit()
-        return cur.lastrowid or 0
+
+
+def _flush() -> None:
+    """Write every queued log entry, including any batch the writer holds."""
+    rows = []
+    taken = 0
+    while True:
+        try:
+            item = _log_queue.get_nowait()
+        except queue.Empty:
+            break
+        taken += 1
+        if item is not _FLUSH:
+            rows.append(item)
+    try:
+        if rows:
+            _write_rows(rows)
+    finally:
+        for _ in range(taken):
+            _log_queue.task_done()
+    if _writer is not None and _writer.is_alive():
+        # Wake the writer so join() returns as soon as its batch is committed
+        _log_queue.put(_FLUSH)
+        _log_queue.join()
+
+
+def _ts_param(dt: datetime) -> str:
+    """Stored-ts prefix for dt; naive datetimes are taken to be UTC already."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec="seconds")
 
 
 def query_logs(
@@ -101,17 +265,22 @@ def query_logs(
     profile: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
-) -> List[Dict[str, Any]]:
-    """Query log entries. Returns list of dicts with keys id, ts, command, args_json, profile, outcome, error_message, duration_ms."""
-    init_db()
+    before_id: Optional[int] = None,
+) -> List[sqlite3.Row]:
+    """Query log entries, newest first. Returns sqlite3.Row objects with columns id, ts, command, args_json, profile, outcome, error_message, duration_ms.
+    
+    Page with before_id (pass the last row's id to get the next page); offset
+    still works but costs a scan over every skipped row.
+    """
+    _flush()
     conditions: List[str] = []
     params: List[Any] = []
     if since is not None:
         conditions.append("ts >= ?")
-        params.append(since.strftime("%Y-%m-%dT%H:%M:%S"))
+        params.append(_ts_param(since))
     if until is not None:
         conditions.append("ts <= ?")
-        params.append(until.strftime("%Y-%m-%dT%H:%M:%S"))
+        params.append(_ts_param(until))
     if command is not None:
         conditions.append("command = ?")
         params.append(command)
@@ -121,21 +290,80 @@ def query_logs(
     if profile is not None:
         conditions.append("profile = ?")
         params.append(profile)
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
     where = " AND ".join(conditions) if conditions else "1=1"
     params.extend([limit, offset])
-    with _get_connection() as conn:
-        cur = conn.execute(
+    with _db_lock:
+        init_db()
+        rows = _get_connection().execute(
             f"""
             SELECT id, ts, command, args_json, profile, outcome, error_message, duration_ms
             FROM cli_logs
             WHERE {where}
-            ORDER BY ts DESC
+            ORDER BY id DESC
             LIMIT ? OFFSET ?
             """,
             params,
-        )
-        rows = cur.fetchall()
-    return [dict(r) for r in rows]
+        ).fetchall()
+    # Rows index by column name already; callers that need dicts (JSON output)
+    # convert them themselves
+    return rows
+
+
+# Message summary cache: the immutable part of a summary (everything but
+# flags) per (account, folder, UIDVALIDITY, UID). The IMAP layer owns the
+# envelope_json format.
+
+# Stay under SQLite's default limit on bound parameters per statement
+_IN_CHUNK = 500
+
+
+def get_cached_envelopes(account: str, folder: str, uidvalidity: int, uids: List[int]) -> Dict[int, str]:
+    """Cached envelope_json by UID for whichever of uids are in the cache."""
+    found: Dict[int, str] = {}
+    with _db_lock:
+        init_db()
+        conn = _get_connection()
+        for i in range(0, len(uids), _IN_CHUNK):
+            chunk = uids[i:i + _IN_CHUNK]
+            rows = conn.execute(
+                f"""
+                SELECT uid, envelope_json FROM msg_envelope_cache
+                WHERE account = ? AND folder = ? AND uidvalidity = ?
+                AND uid IN ({",".join("?" * len(chunk))})
+                """,
+                [account, folder, uidvalidity, *chunk],
+            )
+            for uid, envelope_json in rows:
+                found[uid] = envelope_json
+    return found
+
+
+def cache_envelopes(account: str, folder: str, uidvalidity: int, envelopes: Dict[int, str]) -> None:
+    """Store envelope_json by UID, dropping entries from any older UIDVALIDITY."""
+    with _db_lock:
+        init_db()
+        conn = _get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A new UIDVALIDITY means the server renumbered the folder
+            conn.execute(
+                "DELETE FROM msg_envelope_cache WHERE account = ? AND folder = ? AND uidvalidity <> ?",
+                (account, folder, uidvalidity),
+            )
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO msg_envelope_cache (account, folder, uidvalidity, uid, envelope_json)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [(account, folder, uidvalidity, uid, data) for uid, data in envelopes.items()],
+            )
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
 
 
 @contextmanager
@@ -147,7 +375,7 @@ def log_invocation(
     """Context manager that logs CLI invocation on exit (success or failure)."""
     start = time.perf_counter()
     args_sanitized = sanitize_argv(argv)
-    args_json = json.dumps(args_sanitized, ensure_ascii=False)
+    args_json = orjson.dumps(args_sanitized).decode()
     try:
         yield
         outcome = "success"
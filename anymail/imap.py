@@ -1,11 +1,154 @@
 """IMAP client wrapper."""
 
-import imapclient
+import sqlite3
+import orjson
 from imapclient import IMAPClient
-from typing import List, Optional, Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
-from .types import Profile, MessageSummary
-from .parse import parse_message, extract_snippet, parse_date, format_addresses
+from . import _cache
+from . import db as log_db
+from .types import (
+    Profile,
+    MessageSummary,
+    FLAG_SEEN,
+    FLAG_ANSWERED,
+    FLAG_FLAGGED,
+    FLAG_DELETED,
+)
+from .parse import (
+    parse_message,
+    extract_snippet,
+    snippet_from_text,
+    decode_body_prefix,
+    parse_date,
+    format_addresses,
+)
+
+
+# Seconds before a stalled IMAP connect or command gives up
+IMAP_TIMEOUT = 30
+
+# Summary fetches take the Message-ID header and the MIME structure, then only
+# the first bytes of the first text/plain part. BODY.PEEK leaves \Seen alone.
+_SUMMARY_HEADERS = "BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)]"
+_SNIPPET_BYTES = 4096
+
+# System flags reported in MessageSummary.flags
+_FLAG_MAP = {
+    b"\\Seen": FLAG_SEEN,
+    b"\\Answered": FLAG_ANSWERED,
+    b"\\Flagged": FLAG_FLAGGED,
+    b"\\Deleted": FLAG_DELETED,
+}
+
+
+def _section(data: Dict[bytes, Any], prefix: bytes) -> bytes:
+    """Value of the first FETCH response item whose key starts with prefix."""
+    for key, value in data.items():
+        if key.startswith(prefix):
+            return value or b""
+    return b""
+
+
+def _find_text_plain(bodystructure: Any, section: str = "") -> Optional[Tuple[str, str, str]]:
+    """(section, transfer encoding, charset) of the first text/plain part in a BODYSTRUCTURE."""
+    if bodystructure.is_multipart:
+        for i, part in enumerate(bodystructure[0], 1):
+            found = _find_text_plain(part, f"{section}.{i}" if section else str(i))
+            if found:
+                return found
+        return None
+    
+    if bodystructure[0].lower() != b"text" or bodystructure[1].lower() != b"plain":
+        return None
+    charset = "us-ascii"
+    params = bodystructure[2] or ()
+    for key, value in zip(params[::2], params[1::2]):
+        if key.lower() == b"charset":
+            charset = value.decode("ascii", "replace")
+    encoding = (bodystructure[5] or b"7bit").decode("ascii", "replace").lower()
+    # A non-multipart message's body is section 1
+    return section or "1", encoding, charset
+
+
+def _uid_list(uids: Union[int, List[int]]) -> List[int]:
+    return [uids] if isinstance(uids, int) else list(uids)
+
+
+def _fmt_addr(addr: Any) -> str:
+    """mailbox@host for an ENVELOPE address; undecodable bytes are replaced."""
+    mailbox = addr.mailbox.decode("utf-8", "replace") if addr.mailbox else ""
+    host = addr.host.decode("utf-8", "replace") if addr.host else ""
+    return f"{mailbox}@{host}"
+
+
+def _flag_bits(flags: Any) -> int:
+    """MessageSummary.flags bits from a FLAGS response."""
+    bits = 0
+    for flag in flags:
+        bits |= _FLAG_MAP.get(flag, 0)
+    return bits
+
+
+def _summarize(uid: int, data: Dict[bytes, Any], snippets: Optional[Dict[int, str]]) -> Optional[MessageSummary]:
+    """Build a summary from one FETCH response; snippets is None for RFC822 fetches."""
+    envelope = data.get(b"ENVELOPE")
+    flags = data.get(b"FLAGS", [])
+    
+    if not envelope:
+        return None
+    
+    # Extract envelope data
+    from_addr = _fmt_addr(envelope.from_[0]) if envelope.from_ else ""
+    to_addrs = [_fmt_addr(addr) for addr in envelope.to] if envelope.to else []
+    
+    subject = envelope.subject.decode() if envelope.subject else ""
+    parsed = parse_date(envelope.date) if envelope.date else None
+    date = parsed if parsed is not None else datetime.now()
+    
+    # Extract snippet and Message-ID
+    fetch_body = snippets is None
+    snippet = "" if fetch_body else snippets.get(uid, "")
+    message_id = None
+    raw_message = data.get(b"RFC822") if fetch_body else _section(data, b"BODY[HEADER")
+    if raw_message:
+        try:
+            message = parse_message(raw_message)
+            if fetch_body:
+                snippet = extract_snippet(message)
+            message_id = message.get("Message-ID")
+        except Exception:
+            pass
+    
+    return MessageSummary.acquire(
+        uid=uid,
+        message_id=message_id,
+        from_addr=from_addr,
+        to=to_addrs,
+        subject=subject,
+        date=date,
+        snippet=snippet,
+        flags=_flag_bits(flags),
+    )
+
+
+def _summary_from_cache(uid: int, envelope_json: str, flags: Any) -> Optional[MessageSummary]:
+    """Summary from a cached envelope row; None if the row can't be decoded."""
+    try:
+        message_id, from_addr, to_addrs, subject, date, snippet = orjson.loads(envelope_json)
+        date = datetime.fromisoformat(date)
+    except (ValueError, TypeError):
+        return None
+    return MessageSummary.acquire(
+        uid=uid,
+        message_id=message_id,
+        from_addr=from_addr,
+        to=to_addrs,
+        subject=subject,
+        date=date,
+        snippet=snippet,
+        flags=_flag_bits(flags),
+    )
 
 
 class IMAPClientWrapper:
@@ -15,13 +158,17 @@ class IMAPClientWrapper:
         self.profile = profile
         self.password = password
         self.client: Optional[IMAPClient] = None
+        self._current_folder: Optional[str] = None
+        self._current_info: Dict = {}
     
     def connect(self) -> None:
         """Connect to IMAP server."""
+        self._current_folder = None
         self.client = IMAPClient(
             self.profile.imap_host,
             port=self.profile.imap_port,
             ssl=self.profile.imap_ssl,
+            timeout=IMAP_TIMEOUT,
         )
         self.client.login(self.profile.email, self.password)
     
@@ -33,6 +180,7 @@ class IMAPClientWrapper:
             except Exception:
                 pass
             self.client = None
+            self._current_folder = None
     
     def __enter__(self):
         self.connect()
@@ -42,9 +190,20 @@ class IMAPClientWrapper:
         self.disconnect()
     
     def select_folder(self, folder: str = None) -> Dict:
-        """Select a folder. Returns folder info."""
+        """Select a folder. Returns folder info.
+        
+        Re-selecting the folder that is already selected is a no-op that returns
+        the info from the original SELECT.
+        """
         folder = folder or self.profile.folder_inbox
-        return self.client.select_folder(folder)
+        if folder != self._current_folder:
+            self._current_info = self.client.select_folder(folder)
+            self._current_folder = folder
+        return self._current_info
+    
+    def uidvalidity(self, folder: Optional[str] = None) -> Optional[int]:
+        """The folder's UIDVALIDITY; no extra round trip when it is already selected."""
+        return self.select_folder(folder).get(b"UIDVALIDITY")
     
     def search_messages(
         self,
@@ -55,8 +214,15 @@ class IMAPClientWrapper:
         from_addr: Optional[str] = None,
         subject: Optional[str] = None,
         raw_criteria: Optional[str] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = True,
     ) -> List[int]:
-        """Search for messages matching criteria."""
+        """Search for messages matching criteria.
+        
+        UIDs come back newest first (oldest first with newest_first=False),
+        truncated to limit. Servers with the SORT extension order by Date
+        header; otherwise UID order, i.e. arrival order, is used.
+        """
         self.select_folder(folder)
         
         criteria = []
@@ -72,10 +238,10 @@ class IMAPClientWrapper:
             criteria.append("SEEN")
         
         if since:
-            criteria.append(imapclient.SEARCH_SINCE(since))
+            criteria.extend(["SINCE", since.date()])
         
         if before:
-            criteria.append(imapclient.SEARCH_BEFORE(before))
+            criteria.extend(["BEFORE", before.date()])
         
         if from_addr:
             criteria.append(["FROM", from_addr])
@@ -86,129 +252,173 @@ class IMAPClientWrapper:
         if not criteria:
             criteria = ["ALL"]
         
-        uids = self.client.search(criteria)
-        return list(uids)
+        if self.client.has_capability("SORT"):
+            uids = self.client.sort(["REVERSE", "DATE"] if newest_first else ["DATE"], criteria)
+        else:
+            uids = sorted(self.client.search(criteria), reverse=newest_first)
+        return uids[:limit] if limit else uids
     
     def fetch_messages(
         self,
         uids: List[int],
         folder: Optional[str] = None,
+        fetch_body: bool = False,
     ) -> Dict[int, MessageSummary]:
         """Fetch message summaries."""
-        self.select_folder(folder)
+        return dict(self.iter_messages(uids, folder=folder, fetch_body=fetch_body))
+    
+    def iter_messages(
+        self,
+        uids: List[int],
+        folder: Optional[str] = None,
+        fetch_body: bool = False,
+    ) -> Iterator[Tuple[int, MessageSummary]]:
+        """Yield (uid, summary) pairs in the order of uids.
         
-        # Fetch envelope data and flags
-        messages_data = self.client.fetch(
-            uids,
-            ["ENVELOPE", "FLAGS", "RFC822"],
-        )
+        Unless fetch_body is set, only the headers needed to decode the body and
+        the first bytes of the body are fetched, which is enough for the snippet.
+        Summaries are also cached on disk per UIDVALIDITY, so messages seen
+        before only cost a FLAGS fetch.
+        """
+        folder_info = self.select_folder(folder)
+        
+        if fetch_body:
+            messages_data = self.client.fetch(uids, ["ENVELOPE", "FLAGS", "RFC822"])
+            for uid, data in messages_data.items():
+                summary = _summarize(uid, data, None)
+                if summary is not None:
+                    yield uid, summary
+            return
+        
+        folder_name = folder or self.profile.folder_inbox
+        uidvalidity = folder_info.get(b"UIDVALIDITY")
+        cached = self._cached_envelopes(folder_name, uidvalidity, uids)
+        
+        summaries: Dict[int, MessageSummary] = {}
+        if cached:
+            for uid, data in self.client.fetch(list(cached), ["FLAGS"]).items():
+                if uid in cached:
+                    summary = _summary_from_cache(uid, cached[uid], data.get(b"FLAGS", []))
+                    if summary is None:
+                        del cached[uid]  # Corrupt row: fetch it again below
+                    else:
+                        summaries[uid] = summary
+        
+        missing = [uid for uid in uids if uid not in cached]
+        if missing:
+            messages_data = self.client.fetch(missing, ["ENVELOPE", "FLAGS", "BODYSTRUCTURE", _SUMMARY_HEADERS])
+            snippets = self._fetch_snippets(messages_data)
+            fetched = {}
+            for uid, data in messages_data.items():
+                summary = _summarize(uid, data, snippets)
+                if summary is not None:
+                    summaries[uid] = fetched[uid] = summary
+            self._cache_envelopes(folder_name, uidvalidity, fetched)
+        
+        for uid in uids:
+            summary = summaries.get(uid)
+            if summary is not None:
+                yield uid, summary
+    
+    def _cache_key(self, folder: str, uidvalidity: Optional[int]) -> Optional[Tuple[str, str, int]]:
+        if uidvalidity is None:
+            return None
+        return _cache.account_key(self.profile), folder, uidvalidity
+    
+    def _cached_envelopes(self, folder: str, uidvalidity: Optional[int], uids: List[int]) -> Dict[int, str]:
+        key = self._cache_key(folder, uidvalidity)
+        if key is None or not uids:
+            return {}
+        try:
+            return log_db.get_cached_envelopes(*key, uids)
+        except (sqlite3.Error, OSError):
+            return {}
+    
+    def _cache_envelopes(self, folder: str, uidvalidity: Optional[int], summaries: Dict[int, MessageSummary]) -> None:
+        key = self._cache_key(folder, uidvalidity)
+        if key is None or not summaries:
+            return
+        try:
+            log_db.cache_envelopes(*key, {
+                uid: orjson.dumps([m.message_id, m.from_addr, m.to, m.subject, m.date, m.snippet]).decode()
+                for uid, m in summaries.items()
+            })
+        except (sqlite3.Error, OSError):
+            pass  # The cache is an optimization; never fail a fetch over it
+    
+    def _fetch_snippets(self, messages_data: Dict[int, Dict[bytes, Any]]) -> Dict[int, str]:
+        """Snippets from a partial fetch of each message's first text/plain part.
         
-        summaries = {}
+        One FETCH per distinct section number, which is usually one or two.
+        """
+        by_section: Dict[str, List[int]] = {}
+        decode_info: Dict[int, Tuple[str, str]] = {}
         for uid, data in messages_data.items():
-            envelope = data.get(b"ENVELOPE")
-            flags = data.get(b"FLAGS", [])
-            raw_message = data.get(b"RFC822")
-            
-            if not envelope:
-                continue
-            
-            # Parse flags
-            flags_dict = {
-                "seen": b"\\Seen" in flags,
-                "answered": b"\\Answered" in flags,
-                "flagged": b"\\Flagged" in flags,
-                "deleted": b"\\Deleted" in flags,
-            }
-            
-            # Extract envelope data
-            from_addr = ""
-            if envelope.from_:
-                from_addr = envelope.from_[0].mailbox.decode() + "@" + envelope.from_[0].host.decode()
-            
-            to_addrs = []
-            if envelope.to:
-                to_addrs = [
-                    addr.mailbox.decode() + "@" + addr.host.decode()
-                    for addr in envelope.to
-                ]
-            
-            subject = envelope.subject.decode() if envelope.subject else ""
-            parsed = parse_date(envelope.date) if envelope.date else None
-            date = parsed if parsed is not None else datetime.now()
-            
-            # Extract snippet from raw message
-            snippet = ""
-            if raw_message:
-                try:
-                    message = parse_message(raw_message)
-                    snippet = extract_snippet(message)
-                except Exception:
-                    pass
-            
-            message_id = None
-            if raw_message:
+            bodystructure = data.get(b"BODYSTRUCTURE")
+            found = _find_text_plain(bodystructure) if bodystructure else None
+            if found:
+                section, encoding, charset = found
+                by_section.setdefault(section, []).append(uid)
+                decode_info[uid] = (encoding, charset)
+        
+        snippets = {}
+        for section, section_uids in by_section.items():
+            key = f"BODY[{section}]".encode()
+            fetched = self.client.fetch(section_uids, [f"BODY.PEEK[{section}]<0.{_SNIPPET_BYTES}>"])
+            for uid, data in fetched.items():
                 try:
-                    message = parse_message(raw_message)
-                    message_id = message.get("Message-ID")
+                    text = decode_body_prefix(_section(data, key), *decode_info[uid])
+                    snippets[uid] = snippet_from_text(text)
                 except Exception:
                     pass
-            
-            summaries[uid] = MessageSummary(
-                uid=uid,
-                message_id=message_id,
-                from_addr=from_addr,
-                to=to_addrs,
-                subject=subject,
-                date=date,
-                snippet=snippet,
-                flags=flags_dict,
-            )
-        
-        return summaries
+        return snippets
     
     def fetch_message(self, uid: int, folder: Optional[str] = None) -> bytes:
         """Fetch full message content."""
-        self.select_folder(folder)
-        messages = self.client.fetch([uid], ["RFC822"])
+        messages = self.fetch_raw_messages([uid], folder=folder)
         if uid in messages:
-            return messages[uid].get(b"RFC822", b"")
+            return messages[uid]
         raise ValueError(f"Message {uid} not found")
     
-    def set_flags(self, uid: int, flags: List[str], folder: Optional[str] = None) -> None:
-        """Set flags on a message."""
+    def fetch_raw_messages(self, uids: List[int], folder: Optional[str] = None) -> Dict[int, bytes]:
+        """Fetch full message content for several UIDs in one FETCH."""
+        self.select_folder(folder)
+        messages = self.client.fetch(uids, ["RFC822"])
+        return {uid: data.get(b"RFC822", b"") for uid, data in messages.items()}
+    
+    def set_flags(self, uids: Union[int, List[int]], flags: List[str], folder: Optional[str] = None) -> None:
+        """Set flags on one or more messages."""
         self.select_folder(folder)
-        self.client.set_flags([uid], flags)
+        self.client.set_flags(_uid_list(uids), flags)
     
-    def remove_flags(self, uid: int, flags: List[str], folder: Optional[str] = None) -> None:
-        """Remove flags from a message."""
+    def remove_flags(self, uids: Union[int, List[int]], flags: List[str], folder: Optional[str] = None) -> None:
+        """Remove flags from one or more messages."""
         self.select_folder(folder)
-        self.client.remove_flags([uid], flags)
+        self.client.remove_flags(_uid_list(uids), flags)
     
-    def move_message(self, uid: int, destination_folder: str, folder: Optional[str] = None) -> None:
-        """Move a message to another folder."""
+    def move_message(self, uids: Union[int, List[int]], destination_folder: str, folder: Optional[str] = None) -> None:
+        """Move one or more messages to another folder."""
         self.select_folder(folder)
-        self.client.move([uid], destination_folder)
+        self.client.move(_uid_list(uids), destination_folder)
     
-    def copy_message(self, uid: int, destination_folder: str, folder: Optional[str] = None) -> None:
-        """Copy a message to another folder."""
+    def copy_message(self, uids: Union[int, List[int]], destination_folder: str, folder: Optional[str] = None) -> None:
+        """Copy one or more messages to another folder."""
         self.select_folder(folder)
-        self.client.copy([uid], destination_folder)
+        self.client.copy(_uid_list(uids), destination_folder)
     
-    def delete_message(self, uid: int, folder: Optional[str] = None) -> None:
-        """Delete a message (move to trash for Gmail)."""
-        self.move_message(uid, self.profile.folder_trash, folder)
+    def delete_message(self, uids: Union[int, List[int]], folder: Optional[str] = None) -> None:
+        """Delete one or more messages (move to trash for Gmail)."""
+        self.move_message(uids, self.profile.folder_trash, folder)
     
     def archive_message(self, uid: int, folder: Optional[str] = None) -> None:
         """Archive a message (remove from INBOX for Gmail)."""
-        # Gmail archive: remove INBOX label
-        # For IMAP, we move from INBOX to All Mail, or just remove INBOX
-        # Actually, Gmail's archive is removing the INBOX label
-        # We'll move to All Mail as a safe approach
-        if folder == "INBOX" or folder == self.profile.folder_inbox:
-            self.move_message(uid, self.profile.folder_allmail, folder)
-        else:
-            # If not in INBOX, just move to All Mail
-            self.move_message(uid, self.profile.folder_allmail, folder)
+        self.archive_messages([uid], folder)
+    
+    def archive_messages(self, uids: List[int], folder: Optional[str] = None) -> None:
+        """Archive several messages with a single MOVE."""
+        # Gmail's archive is removing the INBOX label; moving to All Mail does
+        # that, and is the safe choice for messages in other folders too
+        self.move_message(uids, self.profile.folder_allmail, folder)
     
     def list_folders(self) -> List[str]:
         """List all folders."""
@@ -1,25 +1,46 @@
 """Keychain/secret management using keyring."""
 
+import atexit
 import keyring
-from typing import Optional
+from typing import Dict, Optional
 
+# Passwords looked up during this command. Keyring backends are cross-process
+# calls (Keychain, Secret Service), so doctor/auth status and the command
+# that follows them only pay for one lookup per profile. Long-lived callers
+# (--repl, in-process drivers) call clear_cache() between commands.
+_pw_cache: Dict[str, str] = {}
+atexit.register(_pw_cache.clear)
 
-def get_password(profile: str) -> Optional[str]:
+
+def clear_cache() -> None:
+    """Forget passwords looked up so far, so the next lookup sees the keyring as it is now."""
+    _pw_cache.clear()
+
+
+def get_password(profile: str, use_cache: bool = True) -> Optional[str]:
     """Get app password for a profile."""
+    if use_cache and profile in _pw_cache:
+        return _pw_cache[profile]
     try:
         password = keyring.get_password("anymail", profile)
-        return password
     except Exception:
+        # Not cached: a backend hiccup should not stick for the whole process
         return None
+    # Neither is a missing password, which `auth set` may store at any time
+    if password is not None:
+        _pw_cache[profile] = password
+    return password
 
 
 def set_password(profile: str, password: str) -> None:
     """Store app password for a profile."""
+    _pw_cache.pop(profile, None)
     keyring.set_password("anymail", profile, password)
 
 
 def clear_password(profile: str) -> bool:
     """Clear app password for a profile. Returns True if cleared."""
+    _pw_cache.pop(profile, None)
     try:
         keyring.delete_password("anymail", profile)
         return True
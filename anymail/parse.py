@@ -1,15 +1,63 @@
 """MIME parsing and message extraction utilities."""
 
+import binascii
 import email
+import email.policy
+import quopri
 from email.message import EmailMessage, Message
-from typing import Optional, List, Tuple
+from email.utils import getaddresses, parsedate_to_datetime
+from typing import Iterator, Optional, List, Tuple, Union
+from weakref import WeakKeyDictionary
 from datetime import datetime
 from .types import AttachmentInfo
 
+_DEFAULT_POLICY = email.policy.default
+
+# Per-message list of (content_type, content_disposition, part); see _iter_parts
+_parts_cache: "WeakKeyDictionary[Message, List[Tuple[str, str, Optional[Message]]]]" = WeakKeyDictionary()
+
 
 def parse_message(raw_message: bytes) -> EmailMessage:
     """Parse raw email bytes into EmailMessage."""
-    return email.message_from_bytes(raw_message, policy=email.policy.default)
+    return email.message_from_bytes(raw_message, policy=_DEFAULT_POLICY)
+
+
+def _iter_parts(message: Message) -> Iterator[Tuple[str, str, Message]]:
+    """Yield (content_type, content_disposition, part) for every part of message.
+    
+    The tree is walked once per message; later calls replay the cached list.
+    """
+    parts = _parts_cache.get(message)
+    if parts is None:
+        # The root is stored as None: a strong reference to the key would keep
+        # the WeakKeyDictionary entry alive forever
+        parts = [
+            (part.get_content_type(), part.get("Content-Disposition", ""), part if part is not message else None)
+            for part in message.walk()
+        ]
+        _parts_cache[message] = parts
+    for content_type, content_disposition, part in parts:
+        yield content_type, content_disposition, message if part is None else part
+
+
+def _first_content(message: Message, content_type: str) -> Optional[str]:
+    """Content of the first part of content_type that decodes cleanly."""
+    for part_type, _, part in _iter_parts(message):
+        if part_type == content_type:
+            try:
+                return part.get_content()
+            except Exception:
+                continue
+    return None
+
+
+def _attachment_parts(message: Message) -> Iterator[Message]:
+    """Parts with an attachment or inline disposition (multipart messages only)."""
+    if not message.is_multipart():
+        return
+    for _, content_disposition, part in _iter_parts(message):
+        if "attachment" in content_disposition or "inline" in content_disposition:
+            yield part
 
 
 def extract_snippet(message: Message, max_length: int = 200) -> str:
@@ -17,58 +65,59 @@ def extract_snippet(message: Message, max_length: int = 200) -> str:
     # Try to get plain text body
     body = get_plaintext_body(message)
     if body:
-        # Clean up whitespace
-        snippet = " ".join(body.split())
-        if len(snippet) > max_length:
-            snippet = snippet[:max_length] + "..."
-        return snippet
+        return snippet_from_text(body, max_length)
     return ""
 
 
+def snippet_from_text(text: str, max_length: int = 200) -> str:
+    """Collapse whitespace and cut text to max_length."""
+    snippet = " ".join(text.split())
+    if len(snippet) > max_length:
+        snippet = snippet[:max_length] + "..."
+    return snippet
+
+
+def decode_body_prefix(data: bytes, encoding: str, charset: str) -> str:
+    """Decode the first bytes of a body part, which may end mid-line, to text."""
+    if encoding == "base64":
+        data = b"".join(data.split())
+        data = binascii.a2b_base64(data[: len(data) // 4 * 4])
+    elif encoding == "quoted-printable":
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset, errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+
 def get_plaintext_body(message: Message) -> Optional[str]:
     """Extract plain text body from a message."""
-    if message.is_multipart():
-        for part in message.walk():
-            if part.get_content_type() == "text/plain":
-                try:
-                    return part.get_content()
-                except Exception:
-                    continue
-    else:
-        if message.get_content_type() == "text/plain":
-            try:
-                return message.get_content()
-            except Exception:
-                pass
-    return None
+    return _first_content(message, "text/plain")
 
 
 def get_html_body(message: Message) -> Optional[str]:
     """Extract HTML body from a message."""
-    if message.is_multipart():
-        for part in message.walk():
-            if part.get_content_type() == "text/html":
-                try:
-                    return part.get_content()
-                except Exception:
-                    continue
-    else:
-        if message.get_content_type() == "text/html":
-            try:
-                return message.get_content()
-            except Exception:
-                pass
-    return None
+    return _first_content(message, "text/html")
 
 
-def parse_date(date_str: Optional[str]) -> Optional[datetime]:
+def parse_date(date_str: Union[str, datetime, None]) -> Optional[datetime]:
     """Parse an email date string to datetime."""
     if not date_str:
         return None
     
+    # imapclient already parses ENVELOPE dates
+    if isinstance(date_str, datetime):
+        return date_str
+    
+    # ISO 8601 (e.g. 2024-01-01T10:00:00Z) is far cheaper to parse than RFC 2822
+    if date_str[:4].isdigit() and "T" in date_str:
+        try:
+            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        except ValueError:
+            pass
+    
     try:
         # Use email.utils.parsedate_to_datetime for RFC 2822 dates
-        from email.utils import parsedate_to_datetime
         return parsedate_to_datetime(date_str)
     except Exception:
         return None
@@ -76,51 +125,38 @@ def parse_date(date_str: Optional[str]) -> Optional[datetime]:
 
 def get_attachments(message: Message) -> List[AttachmentInfo]:
     """Extract attachment information from a message."""
-    attachments = []
-    
-    if message.is_multipart():
-        for part in message.walk():
-            content_disposition = part.get("Content-Disposition", "")
-            if "attachment" in content_disposition or "inline" in content_disposition:
-                filename = part.get_filename()
-                content_type = part.get_content_type()
-                size = len(part.get_payload(decode=True) or b"")
-                content_id = part.get("Content-ID")
-                
-                attachments.append(
-                    AttachmentInfo(
-                        filename=filename,
-                        content_type=content_type,
-                        size=size,
-                        content_id=content_id,
-                    )
-                )
-    
-    return attachments
+    return [_attachment_info(part) for part in _attachment_parts(message)]
+
+
+def _attachment_info(part: Message) -> AttachmentInfo:
+    return AttachmentInfo(
+        filename=part.get_filename(),
+        content_type=part.get_content_type(),
+        size=len(part.get_payload(decode=True) or b""),
+        content_id=part.get("Content-ID"),
+    )
+
+
+def extract_all(message: Message) -> Tuple[Optional[str], Optional[str], List[AttachmentInfo]]:
+    """Extract (plain body, HTML body, attachments) in a single walk of the MIME tree."""
+    return (
+        get_plaintext_body(message),
+        get_html_body(message),
+        get_attachments(message),
+    )
 
 
 def get_attachment_content(message: Message, filename: Optional[str] = None, content_id: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
     """Get attachment content by filename or content_id. Returns (content, content_type)."""
-    if message.is_multipart():
-        for part in message.walk():
-            content_disposition = part.get("Content-Disposition", "")
-            if "attachment" in content_disposition or "inline" in content_disposition:
-                part_filename = part.get_filename()
-                part_content_id = part.get("Content-ID")
-                
-                if filename and part_filename == filename:
-                    try:
-                        content = part.get_payload(decode=True)
-                        return (content, part.get_content_type()) if content else None
-                    except Exception:
-                        continue
-                
-                if content_id and part_content_id == content_id:
-                    try:
-                        content = part.get_payload(decode=True)
-                        return (content, part.get_content_type()) if content else None
-                    except Exception:
-                        continue
+    for part in _attachment_parts(message):
+        if (filename and part.get_filename() == filename) or (
+            content_id and part.get("Content-ID") == content_id
+        ):
+            try:
+                content = part.get_payload(decode=True)
+                return (content, part.get_content_type()) if content else None
+            except Exception:
+                continue
     
     return None
 
@@ -131,7 +167,6 @@ def format_addresses(addresses: Optional[str]) -> List[str]:
         return []
     
     try:
-        from email.utils import getaddresses
         parsed = getaddresses([addresses])
         return [addr[1] for addr in parsed if addr[1]]  # Return email addresses only
     except Exception:
@@ -1,11 +1,15 @@
 """SMTP sending functionality."""
 
+import mimetypes
 import smtplib
 from email.message import EmailMessage
 from typing import List, Optional
 from pathlib import Path
 from .types import Profile
 
+# Seconds before a stalled SMTP connect or command gives up
+SMTP_TIMEOUT = 30
+
 
 def send_email(
     profile: Profile,
@@ -42,25 +46,29 @@ def send_email(
     if attachments:
         for attachment_path in attachments:
             if attachment_path.exists():
-                with open(attachment_path, "rb") as f:
-                    file_data = f.read()
-                    file_name = attachment_path.name
-                    msg.add_attachment(
-                        file_data,
-                        maintype="application",
-                        subtype="octet-stream",
-                        filename=file_name,
-                    )
+                content_type, encoding = mimetypes.guess_type(attachment_path.name)
+                if content_type is None or encoding is not None:
+                    # Unknown, or compressed (e.g. .tar.gz): send as opaque bytes
+                    content_type = "application/octet-stream"
+                maintype, subtype = content_type.split("/", 1)
+                # Passed straight through so the raw bytes can be freed as soon
+                # as they are base64-encoded into the message
+                msg.add_attachment(
+                    attachment_path.read_bytes(),
+                    maintype=maintype,
+                    subtype=subtype,
+                    filename=attachment_path.name,
+                )
     
     if dry_run:
         return msg
     
     # Send via SMTP
     if profile.smtp_starttls:
-        server = smtplib.SMTP(profile.smtp_host, profile.smtp_port)
+        server = smtplib.SMTP(profile.smtp_host, profile.smtp_port, timeout=SMTP_TIMEOUT)
         server.starttls()
     else:
-        server = smtplib.SMTP_SSL(profile.smtp_host, profile.smtp_port)
+        server = smtplib.SMTP_SSL(profile.smtp_host, profile.smtp_port, timeout=SMTP_TIMEOUT)
     
     try:
         server.login(profile.email, password)
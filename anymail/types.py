@@ -1,66 +1,153 @@
 """Type definitions for AnyMail."""
 
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from collections import deque
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from operator import attrgetter
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 
 
-@dataclass
 class Profile:
-    """Email profile configuration."""
-    name: str
-    email: str
-    imap_host: str
-    imap_port: int
-    imap_ssl: bool
-    smtp_host: str
-    smtp_port: int
-    smtp_starttls: bool
-    folder_inbox: str = "INBOX"
-    folder_sent: str = "[Gmail]/Sent Mail"
-    folder_trash: str = "[Gmail]/Trash"
-    folder_allmail: str = "[Gmail]/All Mail"
-    default_from_name: Optional[str] = None
+    """Email profile configuration.
+    
+    A plain slotted class (no per-instance __dict__); use replace() for a
+    modified copy, as cached profiles are shared. Positional field order:
+    name, email, imap_host, imap_port, imap_ssl, smtp_host, smtp_port,
+    smtp_starttls, folder_inbox, folder_sent, folder_trash, folder_allmail,
+    default_from_name.
+    """
+    __slots__ = (
+        "name",
+        "email",
+        "imap_host",
+        "imap_port",
+        "imap_ssl",
+        "smtp_host",
+        "smtp_port",
+        "smtp_starttls",
+        "folder_inbox",
+        "folder_sent",
+        "folder_trash",
+        "folder_allmail",
+        "default_from_name",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        email: str,
+        imap_host: str,
+        imap_port: int,
+        imap_ssl: bool,
+        smtp_host: str,
+        smtp_port: int,
+        smtp_starttls: bool,
+        folder_inbox: str = "INBOX",
+        folder_sent: str = "[Gmail]/Sent Mail",
+        folder_trash: str = "[Gmail]/Trash",
+        folder_allmail: str = "[Gmail]/All Mail",
+        default_from_name: Optional[str] = None,
+    ):
+        self.name = name
+        self.email = email
+        self.imap_host = imap_host
+        self.imap_port = imap_port
+        self.imap_ssl = imap_ssl
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.smtp_starttls = smtp_starttls
+        self.folder_inbox = folder_inbox
+        self.folder_sent = folder_sent
+        self.folder_trash = folder_trash
+        self.folder_allmail = folder_allmail
+        self.default_from_name = default_from_name
+
+    def __repr__(self) -> str:
+        fields_repr = ", ".join(f"{name}={value!r}" for name, value in zip(_PROFILE_FIELDS, _profile_values(self)))
+        return f"{type(self).__name__}({fields_repr})"
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return _profile_values(self) == _profile_values(other)
+
+    # Mutable and compared by value, like the dataclass it replaces
+    __hash__ = None  # type: ignore[assignment]
+
+    def replace(self, **changes: Any) -> "Profile":
+        """Copy of this profile with some fields changed."""
+        kwargs = dict(zip(_PROFILE_FIELDS, _profile_values(self)))
+        kwargs.update(changes)
+        return type(self)(**kwargs)
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert profile to dictionary for JSON serialization."""
-        return {
-            "name": self.name,
-            "email": self.email,
-            "imap_host": self.imap_host,
-            "imap_port": self.imap_port,
-            "imap_ssl": self.imap_ssl,
-            "smtp_host": self.smtp_host,
-            "smtp_port": self.smtp_port,
-            "smtp_starttls": self.smtp_starttls,
-            "folder_inbox": self.folder_inbox,
-            "folder_sent": self.folder_sent,
-            "folder_trash": self.folder_trash,
-            "folder_allmail": self.folder_allmail,
-            "default_from_name": self.default_from_name,
-        }
+        return dict(zip(_PROFILE_FIELDS, _profile_values(self)))
+
+    def __reduce__(self):
+        # Positional constructor args: smaller and faster to pickle than the
+        # default copyreg.__newobj__ + state path
+        return type(self), _profile_values(self)
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Profile":
-        """Create profile from dictionary."""
-        return cls(
-            name=data["name"],
-            email=data["email"],
-            imap_host=data["imap_host"],
-            imap_port=data["imap_port"],
-            imap_ssl=data.get("imap_ssl", True),
-            smtp_host=data["smtp_host"],
-            smtp_port=data["smtp_port"],
-            smtp_starttls=data.get("smtp_starttls", True),
-            folder_inbox=data.get("folder_inbox", "INBOX"),
-            folder_sent=data.get("folder_sent", "[Gmail]/Sent Mail"),
-            folder_trash=data.get("folder_trash", "[Gmail]/Trash"),
-            folder_allmail=data.get("folder_allmail", "[Gmail]/All Mail"),
-            default_from_name=data.get("default_from_name"),
-        )
-
-
-@dataclass
+        """Create profile from dictionary.
+        
+        Equal dicts give the same (shared) Profile, so treat the result as
+        read-only; use replace() to derive a modified copy.
+        """
+        if cls is not Profile:
+            return cls(**_profile_kwargs(data))
+        try:
+            return _profile_from_items(tuple(sorted(data.items())))
+        except TypeError:
+            # Unhashable values (not produced by config.json): skip the cache
+            return cls(**_profile_kwargs(data))
+
+
+# to_dict/from_dict loop over these instead of spelling out every attribute
+_PROFILE_FIELDS = Profile.__slots__
+_profile_values = attrgetter(*_PROFILE_FIELDS)
+# from_dict defaults; the SSL/STARTTLS defaults only apply when loading
+_PROFILE_DEFAULTS = {
+    "imap_ssl": True,
+    "smtp_starttls": True,
+    "folder_inbox": "INBOX",
+    "folder_sent": "[Gmail]/Sent Mail",
+    "folder_trash": "[Gmail]/Trash",
+    "folder_allmail": "[Gmail]/All Mail",
+    "default_from_name": None,
+}
+_PROFILE_REQUIRED = tuple(name for name in _PROFILE_FIELDS if name not in _PROFILE_DEFAULTS)
+
+
+def _profile_kwargs(data: Dict[str, Any]) -> Dict[str, Any]:
+    kwargs = {name: data[name] for name in _PROFILE_REQUIRED}
+    for name, default in _PROFILE_DEFAULTS.items():
+        kwargs[name] = data.get(name, default)
+    return kwargs
+
+
+@lru_cache(maxsize=32)
+def _profile_from_items(items: Tuple[Tuple[str, Any], ...]) -> Profile:
+    return Profile(**_profile_kwargs(dict(items)))
+
+
+# MessageSummary.flags bits; JSON output spells them out in this order
+FLAG_SEEN = 1
+FLAG_ANSWERED = 2
+FLAG_FLAGGED = 4
+FLAG_DELETED = 8
+_FLAG_NAMES = (
+    ("seen", FLAG_SEEN),
+    ("answered", FLAG_ANSWERED),
+    ("flagged", FLAG_FLAGGED),
+    ("deleted", FLAG_DELETED),
+)
+
+
+@dataclass(slots=True)
 class MessageSummary:
     """Summary of an email message."""
     uid: int
@@ -70,23 +157,91 @@ class MessageSummary:
     subject: str
     date: datetime
     snippet: str
-    flags: Dict[str, bool]  # seen, answered, flagged, etc.
+    flags: int  # FLAG_* bits; to_dict() expands them to {"seen": ..., ...}
+
+    @property
+    def seen(self) -> bool:
+        return bool(self.flags & FLAG_SEEN)
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.flags & FLAG_FLAGGED)
 
     def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for JSON output."""
-        return {
-            "id": self.uid,
-            "message_id": self.message_id,
-            "from": self.from_addr,
-            "to": self.to,
-            "subject": self.subject,
-            "date": self.date.isoformat() if self.date is not None else None,
-            "snippet": self.snippet,
-            "flags": self.flags,
-        }
-
-
-@dataclass
+        """Convert to dictionary for JSON output.
+        
+        date stays a datetime: orjson formats it natively, to the same string
+        isoformat() would give.
+        """
+        d = dict(zip(_SUMMARY_KEYS, _summary_values(self)))
+        d["flags"] = _flags_dict(self.flags)
+        return d
+
+    @staticmethod
+    def to_columns(messages: List["MessageSummary"]) -> Dict[str, list]:
+        """to_dict() for many messages at once, laid out by column.
+        
+        Same keys as to_dict(), each mapped to a list with one value per
+        message: columns[key][i] == messages[i].to_dict()[key].
+        """
+        columns: Dict[str, list] = {key: [] for key in _SUMMARY_KEYS}
+        for key, values in zip(_SUMMARY_KEYS, zip(*map(_summary_values, messages))):
+            columns[key] = list(values)
+        columns["flags"] = [_flags_dict(bits) for bits in columns["flags"]]
+        return columns
+
+    @classmethod
+    def acquire(
+        cls,
+        uid: int,
+        message_id: Optional[str],
+        from_addr: str,
+        to: List[str],
+        subject: str,
+        date: datetime,
+        snippet: str,
+        flags: int,
+    ) -> "MessageSummary":
+        """Same as the constructor, but reuses a released instance if one is pooled."""
+        try:
+            # pop() rather than a length check: the daemon acquires from worker threads
+            obj = _summary_pool.pop() if cls is MessageSummary else None
+        except IndexError:
+            obj = None
+        if obj is None:
+            return cls(uid, message_id, from_addr, to, subject, date, snippet, flags)
+        obj.uid = uid
+        obj.message_id = message_id
+        obj.from_addr = from_addr
+        obj.to = to
+        obj.subject = subject
+        obj.date = date
+        obj.snippet = snippet
+        obj.flags = flags
+        return obj
+
+    def release(self) -> None:
+        """Hand this instance back for acquire() to reuse; don't use it afterwards."""
+        _summary_pool.append(self)
+
+    def __reduce__(self):
+        return type(self), _summary_values(self)
+
+
+def _flags_dict(bits: int) -> Dict[str, bool]:
+    return {name: bool(bits & bit) for name, bit in _FLAG_NAMES}
+
+
+# Released summaries awaiting reuse; listings in long-lived processes (the
+# daemon, --repl) recycle them instead of allocating a fresh one per message
+_summary_pool: "deque[MessageSummary]" = deque(maxlen=256)
+
+# JSON key -> attribute; the attribute names differ for id and from
+_SUMMARY_KEYS = ("id", "message_id", "from", "to", "subject", "date", "snippet", "flags")
+_summary_values = attrgetter("uid", "message_id", "from_addr", "to", "subject", "date", "snippet", "flags")
+
+
+@dataclass(slots=True)
 class AttachmentInfo:
     """Information about an email attachment."""
     filename: Optional[str]
@@ -96,9 +251,11 @@ class AttachmentInfo:
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary."""
-        return {
-            "filename": self.filename,
-            "content_type": self.content_type,
-            "size": self.size,
-            "content_id": self.content_id,
-        }
+        return dict(zip(_ATTACHMENT_FIELDS, _attachment_values(self)))
+
+    def __reduce__(self):
+        return type(self), _attachment_values(self)
+
+
+_ATTACHMENT_FIELDS = tuple(f.name for f in fields(AttachmentInfo))
+_attachment_values = attrgetter(*_ATTACHMENT_FIELDS)
@@ -2,20 +2,40 @@
 
 This is *not* a Clawdbot tool by itself; it is a reusable library you can call from
 other scripts/tests. It provides:
-- a stable way to run AnyMail from the repo venv
+- a stable way to run AnyMail from the repo venv, or in-process when this
+  interpreter can import it (no interpreter startup per call)
 - helpers to enforce JSON output and parse it
+- iter_messages() for streaming large inbox/search listings
+- AnyMailWorker, one long-lived AnyMail child process serving many commands
 
 Keep this deterministic and side-effect explicit.
 """
 
 from __future__ import annotations
 
-import json
+import functools
 import os
-import subprocess
+import sys
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Any, Optional, Sequence
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Sequence
+
+# subprocess, json/orjson, pathlib and anymail.cli are imported where
+# they are used: importing this module for RunResult or ensure_flag (e.g. from
+# a test collector) should not pay for them
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@functools.lru_cache(maxsize=1)
+def _json_loads() -> Any:
+    try:
+        import orjson
+
+        return orjson.loads
+    except ImportError:  # the script may run under an interpreter without it
+        import json
+
+        return json.loads
 
 
 @dataclass
@@ -27,48 +47,251 @@ class RunResult:
     json: Optional[Any] = None
 
 
+# Child environment, built once: the caller's environment at import time with
+# UTF-8 stdio unless the caller chose otherwise. subprocess only reads it.
+_BASE_ENV = {
+    **os.environ,
+    "PYTHONUTF8": os.environ.get("PYTHONUTF8", "1"),
+    "PYTHONIOENCODING": os.environ.get("PYTHONIOENCODING", "utf-8"),
+}
+
+
+@functools.lru_cache(maxsize=4)
 def find_repo_root(start: Optional[Path] = None) -> Path:
+    from pathlib import Path
+
     start = (start or Path(__file__)).resolve()
     # <repo>/skills/anymail/scripts/anymail_api.py
     return start.parents[3]
 
 
+@functools.lru_cache(maxsize=4)
 def choose_python(repo_root: Path) -> str:
-    venv_py = repo_root / ".venv" / "Scripts" / "python.exe"
-    if venv_py.exists():
-        return str(venv_py)
-    return "python"
+    venv = repo_root / ".venv"
+    # Windows layout first, then POSIX
+    for venv_py in (venv / "Scripts" / "python.exe", venv / "bin" / "python"):
+        if venv_py.exists():
+            return str(venv_py)
+    # sys.executable is empty when an embedding host does not report one
+    return sys.executable or "python"
+
+
+# Subprocess timeout for run_anymail calls that don't pass timeout_s
+DEFAULT_TIMEOUT_S = 120
+
+_cli_module: Any = None
+# Stored in _cli_module when the import failed, so later calls skip straight
+# to the subprocess instead of retrying it
+_CLI_UNAVAILABLE = object()
+
+
+def _load_cli(repo_root: Path) -> Any:
+    """Import anymail.cli into this interpreter once; None if it can't be imported."""
+    global _cli_module
+    if _cli_module is None:
+        root = str(repo_root)
+        if root not in sys.path:
+            sys.path.insert(0, root)
+        try:
+            import anymail.cli as cli_module
+        except ImportError:
+            cli_module = _CLI_UNAVAILABLE
+        _cli_module = cli_module
+    return None if _cli_module is _CLI_UNAVAILABLE else _cli_module
 
 
-def run_anymail(args: Sequence[str], *, repo_root: Optional[Path] = None, timeout_s: int = 120) -> RunResult:
+def run_anymail_inproc(
+    args: Sequence[str], *, repo_root: Optional[Path] = None, parse_json: bool = False
+) -> Optional[RunResult]:
+    """Run AnyMail inside this interpreter, skipping interpreter startup per call.
+
+    Returns None when anymail (or one of its dependencies) can't be imported
+    here, e.g. when it is only installed in the repo venv. Only the per
+    operation IMAP/SMTP timeouts apply: the command runs on the calling thread.
+    """
     repo_root = repo_root or find_repo_root()
+    cli_module = _load_cli(repo_root)
+    if cli_module is None:
+        return None
+
+    # Same working directory as the subprocess path
+    code, stdout, stderr = cli_module._run_captured(list(args), cwd=str(repo_root))
+    res = RunResult(
+        ok=code == 0,
+        code=code,
+        stdout=stdout.decode("utf-8", "replace"),
+        stderr=stderr.decode("utf-8", "replace"),
+    )
+    if parse_json:
+        _parse_json(res, stdout)
+    return res
+
+
+def _parse_json(res: RunResult, stdout: bytes) -> None:
+    # best-effort JSON parse if it looks like JSON
+    out = stdout.strip()
+    if out.startswith(b"{") or out.startswith(b"["):
+        try:
+            res.json = _json_loads()(out)
+        except Exception:
+            pass
+
+
+def run_anymail(
+    args: Sequence[str],
+    *,
+    repo_root: Optional[Path] = None,
+    timeout_s: Optional[int] = None,
+    parse_json: bool = False,
+) -> RunResult:
+    """Run an AnyMail command and capture its exit code and output.
+
+    Runs in this interpreter when anymail can be imported here, unless
+    ANYMAIL_INPROC=0. An in-process run can't be killed, but a stalled server
+    can't hang it either: every IMAP and SMTP connect or command gives up
+    after 30 seconds (anymail.imap.IMAP_TIMEOUT, anymail.smtp.SMTP_TIMEOUT)
+    and the command fails. Passing timeout_s always uses a subprocess,
+    killed (raising subprocess.TimeoutExpired) after that many seconds in
+    total; a subprocess run without it gets DEFAULT_TIMEOUT_S. parse_json
+    fills RunResult.json when stdout looks like JSON (run_json sets it).
+
+    Safe to call from several threads, but in-process runs take turns; for
+    commands that should run in parallel, set ANYMAIL_INPROC=0 or pass
+    timeout_s.
+    """
+    repo_root = repo_root or find_repo_root()
+    if timeout_s is None and os.environ.get("ANYMAIL_INPROC", "1") == "1":
+        res = run_anymail_inproc(args, repo_root=repo_root, parse_json=parse_json)
+        if res is not None:
+            return res
+
+    import subprocess
+
     py = choose_python(repo_root)
 
     cmd = [py, "-m", "anymail.cli", *args]
-    env = os.environ.copy()
-    env.setdefault("PYTHONUTF8", "1")
-    env.setdefault("PYTHONIOENCODING", "utf-8")
 
     p = subprocess.run(
         cmd,
         cwd=str(repo_root),
-        env=env,
+        env=_BASE_ENV,
         capture_output=True,
-        text=True,
-        timeout=timeout_s,
+        timeout=DEFAULT_TIMEOUT_S if timeout_s is None else timeout_s,
     )
 
-    res = RunResult(ok=p.returncode == 0, code=p.returncode, stdout=p.stdout or "", stderr=p.stderr or "")
+    # Bytes in: the JSON parser takes them directly, so only the stored text is decoded
+    stdout = p.stdout or b""
+    res = RunResult(
+        ok=p.returncode == 0,
+        code=p.returncode,
+        stdout=stdout.decode("utf-8", "replace"),
+        stderr=(p.stderr or b"").decode("utf-8", "replace"),
+    )
+    if parse_json:
+        _parse_json(res, stdout)
+    return res
 
-    # best-effort JSON parse if it looks like JSON
-    out = (p.stdout or "").strip()
-    if out.startswith("{") or out.startswith("["):
+
+def iter_messages(args: Sequence[str], *, repo_root: Optional[Path] = None) -> Iterator[Any]:
+    """Yield the items of a JSON listing (inbox/search) while AnyMail is still writing it.
+
+    Always runs a subprocess so output can be consumed as it arrives. With
+    ijson installed, memory stays flat however long the listing is; without
+    it the output is parsed in one go once the command finishes. Raises
+    RuntimeError if the command fails; its stderr goes to ours.
+    """
+    import subprocess
+
+    a = list(args)
+    if "--json" not in a:
+        a.append("--json")
+    repo_root = repo_root or find_repo_root()
+    cmd = [choose_python(repo_root), "-m", "anymail.cli", *a]
+
+    p = subprocess.Popen(cmd, cwd=str(repo_root), env=_BASE_ENV, stdout=subprocess.PIPE)
+    try:
+        try:
+            import ijson
+        except ImportError:
+            items = None
+        else:
+            items = ijson.items(p.stdout, "item")
         try:
-            res.json = json.loads(out)
+            if items is None:
+                items = _json_loads()(p.stdout.read())
+            yield from items
         except Exception:
-            pass
+            # A failed command prints nothing parseable; report the exit code instead
+            if p.wait() != 0:
+                raise RuntimeError(f"anymail {' '.join(a)} exited with code {p.returncode}") from None
+            raise
+    finally:
+        # Stopped early: don't leave the command blocked on a full pipe
+        if p.poll() is None:
+            p.kill()
+        p.stdout.close()
+        p.wait()
+    if p.returncode != 0:
+        raise RuntimeError(f"anymail {' '.join(a)} exited with code {p.returncode}")
 
-    return res
+
+class AnyMailWorker:
+    """A long-lived `anymail.cli --repl` child that runs commands sent to it.
+
+    Interpreter startup and imports are paid once, when the worker starts;
+    each run() then costs a line of JSON each way. Use it where in-process
+    runs are not possible (anymail only importable from the repo venv) and
+    many commands follow one another. Not thread-safe; use one per thread.
+    """
+
+    def __init__(self, *, repo_root: Optional[Path] = None):
+        import subprocess
+
+        repo_root = repo_root or find_repo_root()
+        cmd = [choose_python(repo_root), "-m", "anymail.cli", "--repl"]
+        self._proc = subprocess.Popen(
+            cmd, cwd=str(repo_root), env=_BASE_ENV, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+
+    def __enter__(self) -> AnyMailWorker:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def run(self, args: Sequence[str], *, parse_json: bool = False) -> RunResult:
+        import json
+
+        proc = self._proc
+        try:
+            proc.stdin.write(json.dumps(list(args)).encode("utf-8") + b"\n")
+            proc.stdin.flush()
+            line = proc.stdout.readline()
+        except (BrokenPipeError, ValueError):  # ValueError: the worker was closed
+            line = b""
+        if not line:
+            raise RuntimeError("AnyMail worker is not running")
+        reply = _json_loads()(line)
+        res = RunResult(
+            ok=reply["code"] == 0,
+            code=reply["code"],
+            stdout=reply["stdout"],
+            stderr=reply["stderr"],
+        )
+        if parse_json:
+            _parse_json(res, res.stdout.encode("utf-8"))
+        return res
+
+    def run_json(self, args: Sequence[str]) -> RunResult:
+        return self.run(ensure_flag(list(args), "--json"), parse_json=True)
+
+    def close(self) -> None:
+        """Stop the worker: end of input makes it exit after the current command."""
+        proc = self._proc
+        if proc.stdin and not proc.stdin.closed:
+            proc.stdin.close()
+        proc.wait()
+        proc.stdout.close()
 
 
 def ensure_flag(args: list[str], flag: str) -> list[str]:
@@ -82,4 +305,5 @@ def run_json(args: Sequence[str], **kw: Any) -> RunResult:
     a = list(args)
     if "--json" not in a and "--format" not in a:
         a.append("--json")
+    kw.setdefault("parse_json", True)
     return run_anymail(a, **kw)
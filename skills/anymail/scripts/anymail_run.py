@@ -9,7 +9,8 @@ Examples:
 
 Behavior:
 - Prefers the repo venv interpreter: <repo>/.venv/Scripts/python.exe
-- Falls back to `python` on PATH.
+  (Windows) or <repo>/.venv/bin/python
+- Falls back to the interpreter running this script.
 - Executes `python -m anymail <args>` with cwd set to repo root.
 
 Exit code matches the underlying command.
@@ -17,35 +18,49 @@ Exit code matches the underlying command.
 
 from __future__ import annotations
 
+import functools
 import os
 import subprocess
 import sys
 from pathlib import Path
+from typing import Optional
 
 
+@functools.lru_cache(maxsize=1)
 def find_repo_root() -> Path:
     # This file: <repo>/skills/anymail/scripts/anymail_run.py
     here = Path(__file__).resolve()
     return here.parents[3]
 
 
-def choose_python(repo_root: Path) -> str:
-    venv_py = repo_root / ".venv" / "Scripts" / "python.exe"
-    if venv_py.exists():
-        return str(venv_py)
-    return "python"
+def _find_venv_python(repo_root: Path) -> Optional[Path]:
+    venv = repo_root / ".venv"
+    # Windows layout first, then POSIX
+    for candidate in (venv / "Scripts" / "python.exe", venv / "bin" / "python"):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+# Looked up once: this script launches a single command per process
+_VENV_PY = _find_venv_python(find_repo_root())
+
+
+def choose_python() -> str:
+    if _VENV_PY is not None:
+        return str(_VENV_PY)
+    return sys.executable or "python"
 
 
 def main(argv: list[str]) -> int:
-    if "--" in argv:
-        idx = argv.index("--")
-        args = argv[idx + 1 :]
-    else:
+    try:
+        args = argv[argv.index("--") + 1 :]
+    except ValueError:
         # allow calling without explicit --
         args = argv[1:]
 
     repo_root = find_repo_root()
-    py = choose_python(repo_root)
+    py = choose_python()
 
     # AnyMail's CLI entrypoint lives in anymail/cli.py (module: anymail.cli).
     cmd = [py, "-m", "anymail.cli", *args]